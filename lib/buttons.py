@@ -1,4 +1,5 @@
 from machine import Pin # type: ignore
+import time
 
 class ButtonManager:
     # Button pin mappings
@@ -20,8 +21,10 @@ class ButtonManager:
         self.callback = callback
         self.pins = {}
         self.states = {}
+        self.edges = {}  # time.ticks_us() of each button's last edge, for lib/latency_tracer.py
         
         for button_id, pin_num in self.BUTTON_PINS.items():
+            self.edges[button_id] = 0  # Present before the IRQs run, so they only update it
             pin = Pin(pin_num, Pin.IN, Pin.PULL_UP)
             pin.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, 
                    handler=lambda p, bid=button_id: self._handle_interrupt(p, bid))
@@ -30,7 +33,18 @@ class ButtonManager:
 
     def _handle_interrupt(self, pin, button_id):
         """Handle button interrupt and call callback if button is released."""
+        self.edges[button_id] = time.ticks_us()
         new_state = pin.value()
         if self.states[button_id] == False and new_state == True:
             self.callback(button_id)
-        self.states[button_id] = new_state 
\ No newline at end of file
+        self.states[button_id] = new_state
+
+    def resync(self):
+        """
+        Catch up with buttons pressed during light sleep, where edge IRQs are
+        not delivered: a button held down counts as pressed, so its release fires.
+        """
+        for button_id, pin in self.pins.items():
+            if self.states[button_id] and not pin.value():
+                self.edges[button_id] = time.ticks_us()
+                self.states[button_id] = False
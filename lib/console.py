@@ -0,0 +1,151 @@
+from array import array
+
+class Console:
+    """
+    A grid of 8x8 text cells on the display.
+
+    Characters (Unicode code points of the BMP) and their colors live in
+    arrays, one entry per cell. Writing only changes the buffers and widens the dirty span of
+    the row; flush() compares the dirty spans with what was last flushed and
+    draws each run of changed cells as one window. Rows are row_pitch pixels
+    apart, the gap between them stays background.
+
+    The menus share the console returned by menu_console(), and the panel
+    shows either that console or a Scene: menu_console() erases whatever the
+    last scene drew, and Scene.present() calls release() on
+    DisplayDriver.console, so switching between them leaves nothing behind.
+    """
+    def __init__(self, display, x, y, cols, rows, row_pitch=8, bg_color=0x0000, font_file='fonts/vga_8x8.fnt'):
+        self.display = display
+        self.x = x
+        self.y = y
+        self.cols = cols
+        self.rows = rows
+        self.row_pitch = row_pitch
+        self.bg_color = bg_color & 0xFFFF
+        self.font_file = font_file
+        self.chars = array('H', [0x20] * (rows * cols))
+        self.colors = array('H', bytes(2 * rows * cols))
+        self.shown_chars = array('H', self.chars)
+        self.shown_colors = array('H', self.colors)
+        # Dirty span of every row as [first, last) columns, empty while first >= last
+        self.dirty_first = bytearray([cols] * rows)
+        self.dirty_last = bytearray(rows)
+        self.active = False  # True while the panel shows the flushed cells
+
+    def mark(self, row, first, last):
+        if first < self.dirty_first[row]: self.dirty_first[row] = first
+        if last > self.dirty_last[row]: self.dirty_last[row] = last
+
+    def write(self, row, col, text, color=0xFFFF):
+        """Put text at row, col, cut at the end of the row."""
+        if not 0 <= row < self.rows:
+            return
+        color &= 0xFFFF
+        start = row * self.cols
+        first = col
+        for char in text:
+            if col >= self.cols:
+                break
+            code = ord(char)
+            if code > 0xFFFF:
+                code = 0x3F  # '?', fonts index the BMP only
+            i = start + col
+            self.chars[i] = code
+            self.colors[i] = color
+            col += 1
+        if col > first:
+            self.mark(row, first, col)
+
+    def write_line(self, row, text, color=0xFFFF):
+        """Replace a whole row with text, padded with spaces."""
+        self.write(row, 0, text[:self.cols] + ' ' * (self.cols - len(text)), color)
+
+    def clear(self):
+        for row in range(self.rows):
+            self.write_line(row, '')
+
+    def flush(self):
+        """Draw every cell that differs from what the panel shows."""
+        self.active = True
+        chars = self.chars
+        colors = self.colors
+        shown_chars = self.shown_chars
+        shown_colors = self.shown_colors
+        for row in range(self.rows):
+            first = self.dirty_first[row]
+            last = self.dirty_last[row]
+            if first >= last:
+                continue
+            self.dirty_first[row] = self.cols
+            self.dirty_last[row] = 0
+            start = row * self.cols
+            col = first
+            while col < last:
+                i = start + col
+                if chars[i] == shown_chars[i] and (colors[i] == shown_colors[i] or chars[i] == 0x20):
+                    col += 1
+                    continue
+                # A run of changed cells; spaces join any color since only their background shows
+                run_start = col
+                color = colors[i] if chars[i] != 0x20 else None
+                col += 1
+                while col < last:
+                    i = start + col
+                    if chars[i] == shown_chars[i] and (colors[i] == shown_colors[i] or chars[i] == 0x20):
+                        break
+                    if chars[i] != 0x20:
+                        if color is None:
+                            color = colors[i]
+                        elif colors[i] != color:
+                            break
+                    col += 1
+                self.draw_run(row, run_start, col, color)
+                for j in range(start + run_start, start + col):
+                    shown_chars[j] = chars[j]
+                    shown_colors[j] = colors[j]
+
+    def draw_run(self, row, first, last, color):
+        x = self.x + 8 * first
+        y = self.y + row * self.row_pitch
+        if color is None:
+            self.display.fill_rect(x, y, 8 * (last - first), 8, self.bg_color)
+        else:
+            start = row * self.cols
+            text = ''.join(chr(code) for code in self.chars[start + first:start + last])
+            self.display.draw_text_block(x, y, text, color, self.bg_color, self.font_file)
+
+    def release(self):
+        """Erase every cell shown on the panel, so that a Scene can take it over."""
+        if not self.active:
+            return
+        for row in range(self.rows):
+            start = row * self.cols
+            col = 0
+            while col < self.cols:
+                if self.shown_chars[start + col] == 0x20:
+                    col += 1
+                    continue
+                first = col
+                while col < self.cols and self.shown_chars[start + col] != 0x20:
+                    col += 1
+                self.draw_run(row, first, col, None)
+        self.chars[:] = self.shown_chars[:] = array('H', [0x20] * len(self.chars))
+        self.dirty_first[:] = bytes([self.cols] * self.rows)
+        self.dirty_last[:] = bytes(self.rows)
+        self.active = False
+
+def menu_console(display):
+    """
+    The console the menu screens share: one line every 20 pixels, starting at (10, 10).
+
+    Whatever the last Scene drew is erased first, the menus take the panel over.
+    """
+    if display.shown_parts:
+        for part in display.shown_parts:
+            display.fill_rect(part[0], part[1], part[2], part[3], 0x0000)
+        display.shown_parts = set()
+    console = display.console
+    if console is None:
+        console = display.console = Console(display, 10, 10, (display.width - 10) // 8, (display.height - 10) // 20, 20)
+    return console
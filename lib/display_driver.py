@@ -1,44 +1,51 @@
-from machine import Pin # type: ignore
+from machine import Pin, PWM # type: ignore
+from array import array
 import time
+from lib.display_profiler import DisplayProfiler
+from lib.font import Font
 
 class Label:
-    def __init__(self, x, y, text, color, bg_color, font_file='fonts/vga_8x8.bin'):
+    """A line of text drawn straight to the display, scale times the 8x8 font (1 to 3)."""
+    def __init__(self, x, y, text, color, bg_color, font_file='fonts/vga_8x8.fnt', scale=1):
         self.x = x
         self.y = y
         self.text = text
         self.color = color
         self.bg_color = bg_color
         self.font_file = font_file
+        self.scale = scale
         self.visible = False
 
     def draw(self, display):
         """Draw the label on the display with the text color."""
-        for i, char in enumerate(self.text):
-            x_offset = self.x + i * 8  # Assuming font width is 8 pixels
-            display.draw_text(x_offset, self.y, char, self.color, self.font_file)
+        if self.text:
+            display.draw_text_block(self.x, self.y, self.text, self.color, self.bg_color, self.font_file, self.scale)
         self.visible = True
 
     def erase(self, display):
-        """Erase the label by redrawing with background color."""
-        if self.visible:
-            for i, char in enumerate(self.text):
-                x_offset = self.x + i * 8  # Assuming font width is 8 pixels
-                display.draw_text(x_offset, self.y, char, self.bg_color, self.font_file)
-            self.visible = False
+        """Erase the label by filling it with the background color."""
+        if self.visible and self.text:
+            size = 8 * self.scale
+            display.fill_rect(self.x, self.y, size * len(self.text), size, self.bg_color)
+        self.visible = False
 
     def set_text(self, display, new_text):
-        """Update the text of the label efficiently."""
-        max_len = max(len(self.text), len(new_text))
-        for i in range(max_len):
-            current_char = self.text[i] if i < len(self.text) else None
-            new_char = new_text[i] if i < len(new_text) else None
-
-            if current_char != new_char:
-                x_offset = self.x + i * 8  # Assuming font width is 8 pixels
-                if current_char is not None:  # Erase the current character if it exists
-                    display.draw_text(x_offset, self.y, current_char, self.bg_color, self.font_file)
-                if new_char is not None:  # Draw the new character if it exists
-                    display.draw_text(x_offset, self.y, new_char, self.color, self.font_file)
+        """Update the text of the label efficiently: only the changed characters are drawn, as one block."""
+        size = 8 * self.scale
+        common = min(len(self.text), len(new_text))
+        first = 0
+        while first < common and self.text[first] == new_text[first]:
+            first += 1
+        last = common
+        while last > first and self.text[last - 1] == new_text[last - 1]:
+            last -= 1
+        if len(new_text) != len(self.text):
+            last = len(new_text)  # Characters after a length change all move
+        if last > first:
+            display.draw_text_block(self.x + first * size, self.y, new_text[first:last], self.color, self.bg_color,
+                                    self.font_file, self.scale)
+        if len(self.text) > len(new_text):
+            display.fill_rect(self.x + len(new_text) * size, self.y, (len(self.text) - len(new_text)) * size, size, self.bg_color)
 
         self.text = new_text  # Update the text variable
 
@@ -82,19 +89,41 @@ class Picture:
             self.visible = False
 
 class DisplayDriver:
+    SCALED_GLYPHS = 48  # Expanded glyphs kept by scaled_glyph, 768 bytes each at scale 3
+    BACKLIGHT_HZ = 2000
+
     def __init__(self):
         # Pin configuration
         self.data_pins = [Pin(i, Pin.OUT) for i in range(35, 43)] + [Pin(2, Pin.OUT)]
         self.dc = Pin(13, Pin.OUT)  # Data/Command
         self.wr = Pin(12, Pin.OUT)  # Write
         self.cs = Pin(11, Pin.OUT)  # Chip Select
+        self.cs_pin = self.cs  # The Pin itself, self.cs gets wrapped by DisplayProfiler and LatencyTracer
         self.reset = Pin(14, Pin.OUT)  # Reset
-        self.backlight = Pin(3, Pin.OUT)  # Backlight
+        self.backlight = self.init_backlight(Pin(3, Pin.OUT))  # LCD_BKLT_PWM, see set_brightness
+        self.brightness = 0
+        self.panel_asleep = False
+        self.sleep_ms = 0  # time.ticks_ms() of the last SLPIN
 
         # Screen dimensions
         self.width = 320  # Logical width
         self.height = 240  # Logical height
 
+        # Bus counters, off until profiler.enable() is called
+        self.profiler = DisplayProfiler(self)
+
+        # Parts of the retained scene currently on the panel, see lib/scene.py
+        self.shown_parts = set()
+        self.console = None  # lib.console.Console of the menus, created on first use
+        self.glyph_cache = {}
+        self.fonts = {}  # Font file -> lib.font.Font
+        self.scaled_glyphs = {}  # (font file, char, scale, color, bg color) -> window columns, see scaled_glyph
+        self.snapshots = None  # lib.snapshot_cache.SnapshotCache, when composed text is kept on flash
+
+        # Hardware scroll area in logical columns, see set_scroll_area
+        self.scroll_x = 0
+        self.scroll_width = self.width
+
     def transform_coordinates(self, x, y):
         return self.height - 1 - y, self.width - 1 - x
 
@@ -107,6 +136,200 @@ class DisplayDriver:
         self.wr.off()
         self.wr.on()
 
+    def write_color(self, color, count=1):
+        """Push an RGB565 color to display RAM count times (after a 0x2C command)."""
+        self.dc.value(1)
+        high_byte, low_byte = (color >> 8) & 0xFF, color & 0xFF
+        for _ in range(count):
+            for i, pin in enumerate(self.data_pins):
+                pin.value((high_byte >> i) & 1)
+            self.wr.off()
+            self.wr.on()
+            for i, pin in enumerate(self.data_pins):
+                pin.value((low_byte >> i) & 1)
+            self.wr.off()
+            self.wr.on()
+
+    def write_colors(self, colors):
+        """Push a sequence of RGB565 colors to display RAM (after a 0x2C command)."""
+        self.dc.value(1)
+        for color in colors:
+            high_byte, low_byte = (color >> 8) & 0xFF, color & 0xFF
+            for i, pin in enumerate(self.data_pins):
+                pin.value((high_byte >> i) & 1)
+            self.wr.off()
+            self.wr.on()
+            for i, pin in enumerate(self.data_pins):
+                pin.value((low_byte >> i) & 1)
+            self.wr.off()
+            self.wr.on()
+
+    def set_window(self, x, y, width, height):
+        """
+        Open a logical rectangle for writing and start a RAM write (CS must be low).
+
+        Because of the panel's rotation, pixels are then consumed column by
+        column from right to left, each column from bottom to top.
+        """
+        column_start, page_start = self.transform_coordinates(x + width - 1, y + height - 1)
+        column_end, page_end = self.transform_coordinates(x, y)
+        self.write_9bit(0x2A, is_data=False)
+        self.write_9bit(column_start >> 8)
+        self.write_9bit(column_start & 0xFF)
+        self.write_9bit(column_end >> 8)
+        self.write_9bit(column_end & 0xFF)
+        self.write_9bit(0x2B, is_data=False)
+        self.write_9bit(page_start >> 8)
+        self.write_9bit(page_start & 0xFF)
+        self.write_9bit(page_end >> 8)
+        self.write_9bit(page_end & 0xFF)
+        self.write_9bit(0x2C, is_data=False)
+
+    def fill_rect(self, x, y, width, height, color):
+        """Fill a rectangle with one color in a single window transfer."""
+        self.cs.off()
+        self.set_window(x, y, width, height)
+        self.write_color(color, width * height)
+        self.cs.on()
+
+    def blit(self, x, y, width, height, colors):
+        """Write a rectangle of colors, given in set_window() order, in a single window transfer."""
+        self.cs.off()
+        self.set_window(x, y, width, height)
+        self.write_colors(colors)
+        self.cs.on()
+
+    def font(self, font_file='fonts/vga_8x8.fnt'):
+        """The Font of font_file, loaded once."""
+        font = self.fonts.get(font_file)
+        if font is None:
+            font = Font(font_file)
+            if (font.width, font.height) != (8, 8):
+                # Every text routine and layout here works in 8x8 cells
+                raise ValueError(f"{font_file} is {font.width}x{font.height}, the display draws 8x8 fonts")
+            self.fonts[font_file] = font
+        return font
+
+    def glyph(self, char, font_file='fonts/vga_8x8.fnt'):
+        """The 8 row bytes of a character, read from the font once and cached."""
+        key = (font_file, char)
+        glyph = self.glyph_cache.get(key)
+        if glyph is None:
+            glyph = self.glyph_cache[key] = self.font(font_file).glyph(char)
+        return glyph
+
+    def scaled_glyph(self, char, font_file, scale, color, bg_color):
+        """
+        The colors of a glyph scale times larger, as its 8 distinct window
+        columns of 8 * scale pixels, from the right one and each from the
+        bottom (the order of set_window). Expanded once per color and kept,
+        a text block then only copies columns.
+        """
+        key = (font_file, char, scale, color, bg_color)
+        columns = self.scaled_glyphs.get(key)
+        if columns is None:
+            if len(self.scaled_glyphs) >= self.SCALED_GLYPHS:
+                self.scaled_glyphs = {}
+            glyph = self.glyph(char, font_file)
+            columns = array('H', bytes(2 * 8 * 8 * scale))
+            i = 0
+            for column in range(7, -1, -1):
+                mask = 0x80 >> column
+                for row in range(7, -1, -1):
+                    value = color if glyph[row] & mask else bg_color
+                    for _ in range(scale):
+                        columns[i] = value
+                        i += 1
+            self.scaled_glyphs[key] = columns
+        return columns
+
+    def draw_text_block(self, x, y, text, color, bg_color, font_file='fonts/vga_8x8.fnt', scale=1):
+        """Draw text together with its background as one window of 8x8 cells, or scale times larger."""
+        size = 8 * scale
+        width = size * len(text)
+        color &= 0xFFFF  # Only the low 16 bits reach the bus, as in write_color
+        bg_color &= 0xFFFF
+        name = None
+        if self.snapshots is not None and size * width >= self.snapshots.MIN_PIXELS:
+            # The font's CRC makes a rebuilt font file miss the blocks drawn with the old one
+            name = self.snapshots.name(text, color, bg_color, font_file, self.font(font_file).crc, scale)
+            if self.snapshots.draw(self, x, y, width, size, name):
+                return
+        if scale > 1:
+            colors = array('H', bytes(2 * size * width))
+            i = 0
+            for char in reversed(text):  # The window fills from the right
+                columns = self.scaled_glyph(char, font_file, scale, color, bg_color)
+                for start in range(0, 8 * size, size):
+                    column = columns[start:start + size]
+                    for _ in range(scale):
+                        colors[i:i + size] = column
+                        i += size
+            self.blit(x, y, width, size, colors)
+            if name is not None:
+                self.snapshots.store(name, colors)
+            return
+        glyphs = [self.glyph(char, font_file) for char in text]
+        colors = array('H', bytes(2 * 8 * width))
+        i = 0
+        for column in range(width - 1, -1, -1):
+            glyph = glyphs[column >> 3]
+            mask = 0x80 >> (column & 7)
+            for row in range(7, -1, -1):
+                colors[i] = color if glyph[row] & mask else bg_color
+                i += 1
+        self.blit(x, y, width, 8, colors)
+        if name is not None:
+            self.snapshots.store(name, colors)
+
+    def draw_bitmap(self, x, y, image_data, color, bg_color):
+        """Draw a 2D list of 0s and 1s in one window transfer."""
+        height = len(image_data)
+        width = len(image_data[0])
+        color &= 0xFFFF
+        bg_color &= 0xFFFF
+        colors = array('H', bytes(2 * width * height))
+        i = 0
+        for column in range(width - 1, -1, -1):
+            for row in range(height - 1, -1, -1):
+                colors[i] = color if image_data[row][column] else bg_color
+                i += 1
+        self.blit(x, y, width, height, colors)
+
+    def set_scroll_area(self, x, width):
+        """
+        Make logical columns x .. x + width - 1 scroll, the rest of the screen stays put.
+
+        The panel scrolls along its own lines, which run across the logical x
+        axis here, so content scrolls sideways. Lines are numbered from the
+        right edge of the screen (see transform_coordinates), so the area right
+        of the scroll area is the top fixed area (TFA) and x is the bottom one (BFA).
+        """
+        top = self.width - x - width
+        self.scroll_x = x
+        self.scroll_width = width
+        self.cs.off()
+        self.write_9bit(0x33, is_data=False)  # VSCRDEF
+        for value in (top, width, x):
+            self.write_9bit(value >> 8)
+            self.write_9bit(value & 0xFF)
+        self.cs.on()
+
+    def scroll_to(self, offset):
+        """
+        Shift the scroll area so that content drawn offset pixels right of it shows at its left edge.
+
+        Content offset c is drawn at logical x scroll_x + c % scroll_width,
+        wherever the area is scrolled to, so after scrolling only the columns
+        that came into view need drawing. scroll_to(0) restores the normal view.
+        """
+        start = self.width - self.scroll_x - self.scroll_width + (-offset) % self.scroll_width
+        self.cs.off()
+        self.write_9bit(0x37, is_data=False)  # VSCRSADD
+        self.write_9bit(start >> 8)
+        self.write_9bit(start & 0xFF)
+        self.cs.on()
+
     def init_display(self):
         self.reset.off()
         time.sleep(0.1)
@@ -128,6 +351,53 @@ class DisplayDriver:
         self.write_9bit(0x29, is_data=False)
         self.cs.on()
 
+    def init_backlight(self, pin):
+        """PWM on the backlight pin, kept running in light sleep where the port can."""
+        try:
+            pwm = PWM(pin, freq=self.BACKLIGHT_HZ, duty_u16=0, lightsleep=True)
+            self.backlight_in_lightsleep = True
+        except TypeError:
+            pwm = PWM(pin, freq=self.BACKLIGHT_HZ, duty_u16=0)
+            self.backlight_in_lightsleep = False
+        return pwm
+
+    def set_brightness(self, percent):
+        """Backlight level from 0 (off) to 100. The duty grows with its square, so fades look even."""
+        self.brightness = percent
+        self.backlight.duty_u16(percent * percent * 65535 // 10000)
+
+    def sleep_panel(self):
+        """Blank the panel and put it in sleep mode (DISPOFF, SLPIN). Its RAM is kept and can still be drawn to."""
+        self.cs.off()
+        self.write_9bit(0x28, is_data=False)
+        self.write_9bit(0x10, is_data=False)
+        self.cs.on()
+        self.panel_asleep = True
+        self.sleep_ms = time.ticks_ms()
+
+    def wake_panel(self):
+        """Leave sleep mode and show the RAM again (SLPOUT, DISPON)."""
+        # SLPOUT is only allowed 120 ms after SLPIN, and takes 5 ms before the next command
+        time.sleep_ms(max(0, 120 - time.ticks_diff(time.ticks_ms(), self.sleep_ms)))
+        self.cs.off()
+        self.write_9bit(0x11, is_data=False)
+        time.sleep_ms(5)
+        self.write_9bit(0x29, is_data=False)
+        self.cs.on()
+        self.panel_asleep = False
+
+    def hold_pins(self, hold):
+        """
+        Hold the bus idle and the backlight off through deep sleep (hold=True),
+        or let the pins follow the driver again after a start from it.
+        """
+        if hold:
+            # The PWM stops in deep sleep, so the backlight pin is held low as a plain output
+            self.backlight.deinit()
+            Pin(3, Pin.OUT, value=0)
+        for pin in (self.cs_pin, self.wr, self.dc, self.reset, Pin(3)):
+            pin.init(hold=hold)
+
     def fill_screen(self, color):
         self.draw_line(0, 0, self.width - 1, self.height - 1, 0xFFFF, 1)
         
@@ -143,33 +413,20 @@ class DisplayDriver:
         self.write_9bit((self.width - 1) >> 8)
         self.write_9bit((self.width - 1) & 0xFF)
         self.write_9bit(0x2C, is_data=False)
-
-        self.dc.value(1)
-        high_byte, low_byte = (color >> 8) & 0xFF, color & 0xFF
-        for _ in range(self.width * self.height):
-            for i, pin in enumerate(self.data_pins):
-                pin.value((high_byte >> i) & 1)
-            self.wr.off()
-            self.wr.on()
-            for i, pin in enumerate(self.data_pins):
-                pin.value((low_byte >> i) & 1)
-            self.wr.off()
-            self.wr.on()
+        self.write_color(color, self.width * self.height)
         self.cs.on()
 
-    def draw_text(self, x, y, text, color, font_file='fonts/vga_8x8.bin'):
+    def draw_text(self, x, y, text, color, font_file='fonts/vga_8x8.fnt'):
         font_width = 8
         font_height = 8
-        with open(font_file, 'rb') as f:
-            for char_index, char in enumerate(text):
-                f.seek(ord(char) * font_height)
-                font_data = list(f.read(font_height))
-                for row in range(font_height):
-                    byte = font_data[row]
-                    for col in range(8):
-                        # Only draw the pixel if it is part of the character
-                        if byte & (1 << (7 - col)):
-                            self.draw_pixel(x + col + char_index * font_width, y + row, color)
+        for char_index, char in enumerate(text):
+            font_data = self.glyph(char, font_file)
+            for row in range(font_height):
+                byte = font_data[row]
+                for col in range(8):
+                    # Only draw the pixel if it is part of the character
+                    if byte & (1 << (7 - col)):
+                        self.draw_pixel(x + col + char_index * font_width, y + row, color)
 
     def draw_pixel(self, x, y, color):
         x, y = self.transform_coordinates(x, y)
@@ -185,17 +442,7 @@ class DisplayDriver:
         self.write_9bit(y >> 8)
         self.write_9bit(y & 0xFF)
         self.write_9bit(0x2C, is_data=False)
-
-        self.dc.value(1)
-        high_byte, low_byte = (color >> 8) & 0xFF, color & 0xFF
-        for i, pin in enumerate(self.data_pins):
-            pin.value((high_byte >> i) & 1)
-        self.wr.off()
-        self.wr.on()
-        for i, pin in enumerate(self.data_pins):
-            pin.value((low_byte >> i) & 1)
-        self.wr.off()
-        self.wr.on()
+        self.write_color(color)
         self.cs.on()
 
     def write_row(self, y, colors):
@@ -230,7 +477,7 @@ class DisplayDriver:
 # Main usage
 if __name__ == "__main__":
     display = DisplayDriver()
-    display.backlight.on()
+    display.set_brightness(100)
     display.init_display()
     display.fill_screen(0x0000)
 
@@ -0,0 +1,220 @@
+import time
+import json
+
+# Indexes into the counter lists kept per call and per section
+CALLS = 0
+CMD_BYTES = 1
+DATA_BYTES = 2
+TRANSACTIONS = 3
+PIXELS = 4
+TIME_US = 5
+FIELDS = ("calls", "cmd_bytes", "data_bytes", "transactions", "pixels", "time_us")
+
+def unwrap_pin(owner, name, wrapper):
+    """
+    Take wrapper out of the chain of pin wrappers at owner.name (each passes
+    its calls on to .pin), wherever it sits, so that the profiler's and
+    lib/latency_tracer.py's wrappers can come off in any order.
+    """
+    while getattr(owner, name) is not wrapper:
+        owner, name = getattr(owner, name), "pin"
+    setattr(owner, name, wrapper.pin)
+
+class _CountingPin:
+    """Wraps the CS pin so every falling edge counts as one bus transaction."""
+    def __init__(self, pin, live):
+        self.pin = pin
+        self.live = live
+
+    def off(self):
+        self.live[TRANSACTIONS] += 1
+        self.pin.off()
+
+    def on(self):
+        self.pin.on()
+
+    def value(self, *args):
+        if args and not args[0]:
+            self.live[TRANSACTIONS] += 1
+        return self.pin.value(*args)
+
+class DisplayProfiler:
+    """
+    Opt-in bus counters and per-call timings for a DisplayDriver.
+
+    Nothing is patched until enable() is called: the public draw calls and the
+    bus primitives are shadowed by counting wrappers on the driver instance and
+    removed again by disable(), so a disabled profiler only costs the enabled
+    check in begin_transition()/end_transition().
+
+    Counts are attributed to the outermost public call (draw_text pays for the
+    draw_pixel calls it makes) and grouped into sections: one per state
+    transition, named "<FromState>-><ToState>", and one per state for what is
+    drawn while it is shown.
+    """
+    PUBLIC_CALLS = ["draw_pixel", "draw_text", "draw_line", "fill_screen",
+                    "fill_rect", "blit", "draw_text_block", "draw_bitmap",
+                    "set_scroll_area", "scroll_to"]
+
+    def __init__(self, display):
+        self.display = display
+        self.enabled = False
+        self.sections = {}
+        self.live = [0] * len(FIELDS)  # Running totals, updated by the bus wrappers
+        self._calls = {}               # Per-call counters for the open section
+        self._section_start = None
+        self._depth = 0
+        self._pin = None               # The _CountingPin on the display's CS pin while enabled
+
+    def enable(self):
+        """Install the counting wrappers on the display driver."""
+        if self.enabled:
+            return
+        display = self.display
+        for name in self.PUBLIC_CALLS:
+            setattr(display, name, self._timed(name, getattr(display, name)))
+        display.write_9bit = self._count_9bit(display.write_9bit)
+        display.write_color = self._count_color(display.write_color)
+        display.write_colors = self._count_colors(display.write_colors)
+        self._pin = display.cs = _CountingPin(display.cs, self.live)
+        self.enabled = True
+        self._open()
+
+    def disable(self):
+        """Remove the wrappers so the driver runs its plain methods again."""
+        if not self.enabled:
+            return
+        self._close("untracked")
+        display = self.display
+        for name in self.PUBLIC_CALLS + ["write_9bit", "write_color", "write_colors"]:
+            delattr(display, name)
+        unwrap_pin(display, "cs", self._pin)
+        self._pin = None
+        self.enabled = False
+
+    def reset(self):
+        """Drop every recorded section."""
+        self.sections = {}
+        if self.enabled:
+            self._open()
+
+    def _timed(self, name, method):
+        live = self.live
+
+        def wrapper(*args, **kwargs):
+            if self._depth:
+                return method(*args, **kwargs)
+            self._depth = 1
+            before = list(live)
+            start = time.ticks_us()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.ticks_diff(time.ticks_us(), start)
+                self._depth = 0
+                stats = self._calls.get(name)
+                if stats is None:
+                    stats = self._calls[name] = [0] * len(FIELDS)
+                stats[CALLS] += 1
+                for field in (CMD_BYTES, DATA_BYTES, TRANSACTIONS, PIXELS):
+                    stats[field] += live[field] - before[field]
+                stats[TIME_US] += elapsed
+        return wrapper
+
+    def _count_9bit(self, method):
+        live = self.live
+
+        def wrapper(value, is_data=True):
+            live[DATA_BYTES if is_data else CMD_BYTES] += 1
+            method(value, is_data)
+        return wrapper
+
+    def _count_color(self, method):
+        live = self.live
+
+        def wrapper(color, count=1):
+            live[DATA_BYTES] += 2 * count
+            live[PIXELS] += count
+            method(color, count)
+        return wrapper
+
+    def _count_colors(self, method):
+        live = self.live
+
+        def wrapper(colors):
+            live[DATA_BYTES] += 2 * len(colors)
+            live[PIXELS] += len(colors)
+            method(colors)
+        return wrapper
+
+    def _open(self):
+        self._calls = {}
+        self._section_start = list(self.live)
+        self._section_start[TIME_US] = time.ticks_us()
+
+    def _close(self, key):
+        start = self._section_start
+        if start is None:
+            return
+        elapsed = time.ticks_diff(time.ticks_us(), start[TIME_US])
+        section = self.sections.get(key)
+        if section is None:
+            section = self.sections[key] = {"total": [0] * len(FIELDS), "calls": {}}
+
+        total = section["total"]
+        total[CALLS] += 1
+        for field in (CMD_BYTES, DATA_BYTES, TRANSACTIONS, PIXELS):
+            total[field] += self.live[field] - start[field]
+        total[TIME_US] += elapsed
+
+        for name, stats in self._calls.items():
+            merged = section["calls"].get(name)
+            if merged is None:
+                merged = section["calls"][name] = [0] * len(FIELDS)
+            for field in range(len(FIELDS)):
+                merged[field] += stats[field]
+
+        self._calls = {}
+        self._section_start = None
+
+    def begin_transition(self, state):
+        """
+        Start measuring a state transition. Drawing done since the previous
+        transition (e.g. Wi-Fi icon updates) is filed under the state's name.
+        """
+        if not self.enabled:
+            return
+        self._close(state)
+        self._open()
+
+    def end_transition(self, from_state, to_state):
+        """File the transition under "<from_state>-><to_state>"."""
+        if not self.enabled:
+            return
+        self._close(f"{from_state}->{to_state}")
+        self._open()
+
+    def snapshot(self):
+        """Return the recorded sections as plain dictionaries."""
+        result = {}
+        for key, section in self.sections.items():
+            result[key] = {
+                "total": dict(zip(FIELDS, section["total"])),
+                "calls": {name: dict(zip(FIELDS, stats)) for name, stats in section["calls"].items()},
+            }
+        return result
+
+    def save(self, path="/display_profile.json"):
+        """Write the snapshot to the file system as JSON."""
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file)
+
+    def report(self):
+        """Print a table of the recorded sections, for use from the REPL."""
+        header = "".join(f"{field:>14}" for field in FIELDS)
+        for key, section in self.sections.items():
+            print(key)
+            print(f"  {'':<12}{header}")
+            rows = [("total", section["total"])] + sorted(section["calls"].items())
+            for name, stats in rows:
+                print(f"  {name:<12}" + "".join(f"{value:>14}" for value in stats))
@@ -0,0 +1,197 @@
+import os
+import struct
+from array import array
+
+# File layout, all little-endian:
+#   header   magic, record count, string count, index entries, longest event in days, string section bytes
+#   records  fixed-size, sorted by start time
+#   strings  one length byte and the UTF-8 bytes per string, records refer to them by number
+#   index    (day, first record) for every day that has an event starting on it
+HEADER = "<4sIHIHI"
+HEADER_SIZE = struct.calcsize(HEADER)
+MAGIC = b"EVS3"
+# start, end (pack_time values), subject id, source, then string numbers: subject name
+# (for subjects without an id, "" otherwise), teacher, location, exceptional
+RECORD = "<IIBBHHHH"
+RECORD_SIZE = struct.calcsize(RECORD)
+BATCH = 16  # Records read per readinto
+
+def day_key(packed):
+    """Days in order across years: the year and day-of-year bits of a pack_time value."""
+    return packed >> 14
+
+class StoreWriter:
+    """Writes a store file from records given in start order."""
+    def __init__(self, file):
+        self.file = file
+        self.record = bytearray(RECORD_SIZE)
+        self.strings = {}  # Text -> number, in order of first use
+        self.index = array("I")
+        self.count = 0
+        self.max_span = 0
+        file.write(bytes(HEADER_SIZE))  # Filled in by finish()
+
+    def add(self, start, end, subject_id, source, subject, teacher, location, exceptional):
+        numbers = [self.strings.setdefault(text, len(self.strings)) for text in (subject, teacher, location, exceptional)]
+        struct.pack_into(RECORD, self.record, 0, start, end, subject_id, source, *numbers)
+        self.file.write(self.record)
+        key = day_key(start)
+        if not self.index or self.index[-2] != key:
+            self.index.append(key)
+            self.index.append(self.count)
+        self.max_span = max(self.max_span, day_key(end) - key)
+        self.count += 1
+
+    def add_event(self, event, source=0):
+        # Mapped subjects get their name back from the id, only the others store it
+        self.add(event.start, event.end, event.subjectID, source, "" if event.subjectID else event.subjectName,
+                 event.teacher, event.location, event.exceptional)
+
+    def finish(self):
+        table = [""] * len(self.strings)
+        for text, number in self.strings.items():
+            table[number] = text
+        string_bytes = 0
+        for text in table:
+            data = text.encode("utf-8")
+            while len(data) > 255:
+                text = text[:-1]
+                data = text.encode("utf-8")
+            self.file.write(bytes((len(data),)))
+            self.file.write(data)
+            string_bytes += 1 + len(data)
+        self.file.write(self.index)
+        self.file.seek(0)
+        self.file.write(struct.pack(HEADER, MAGIC, self.count, len(table), len(self.index) // 2, self.max_span, string_bytes))
+
+class EventStore:
+    """
+    The events of every synced week, on flash.
+
+    events_between() binary-searches the day index, which is the only part
+    kept in RAM besides the strings, and reads just the records of the
+    requested days with readinto(). update() merges a sync into the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.buf = bytearray(BATCH * RECORD_SIZE)
+        self.load()
+
+    def load(self):
+        self.count = 0
+        self.max_span = 0
+        self.strings = []
+        self.index = array("I")  # Day, first record, day, first record...
+        try:
+            with open(self.path, "rb") as file:
+                header = file.read(HEADER_SIZE)
+                if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+                    return  # Missing or from another version, the next sync rewrites it
+                magic, self.count, string_count, index_count, self.max_span, string_bytes = struct.unpack(HEADER, header)
+                file.seek(HEADER_SIZE + self.count * RECORD_SIZE)
+                data = file.read(string_bytes)
+                position = 0
+                for _ in range(string_count):
+                    length = data[position]
+                    self.strings.append(str(data[position + 1:position + 1 + length], "utf-8"))
+                    position += 1 + length
+                self.index = array("I", file.read(index_count * 8))
+        except OSError:
+            pass
+
+    def first_record(self, key):
+        """Number of the first record starting on day key or later."""
+        low, high = 0, len(self.index) // 2
+        while low < high:
+            middle = (low + high) // 2
+            if self.index[2 * middle] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return self.index[2 * low + 1] if low < len(self.index) // 2 else self.count
+
+    def records(self, first=0):
+        """Yield the raw record tuples from number first on."""
+        if first >= self.count:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(HEADER_SIZE + first * RECORD_SIZE)
+            view = memoryview(self.buf)
+            remaining = self.count - first
+            while remaining:
+                count = min(BATCH, remaining)
+                file.readinto(view[:count * RECORD_SIZE])
+                for i in range(count):
+                    yield struct.unpack_from(RECORD, self.buf, i * RECORD_SIZE)
+                remaining -= count
+
+    def events_between(self, start, end, colors=None):
+        """
+        Events overlapping start..end (pack_time values, inclusive), in start order.
+        colors maps source numbers to a color that replaces their subject colors.
+        """
+        from lib.pronote import Event, SUBJECT_MAPPINGS
+        events = []
+        # An event that began up to max_span days before start can still be running
+        records = self.records(self.first_record(max(0, day_key(start) - self.max_span)))
+        for record in records:
+            if record[0] > end:
+                break
+            if record[1] < start:
+                continue
+            event = Event()
+            event.start, event.end, event.subjectID, event.source = record[0], record[1], record[2], record[3]
+            event.subjectName, event.subjectColor = SUBJECT_MAPPINGS.get(record[2], SUBJECT_MAPPINGS[0])
+            if record[2] == 0 and self.strings[record[4]]:
+                event.subjectName = self.strings[record[4]]
+            if colors and record[3] in colors:
+                event.subjectColor = colors[record[3]]
+            event.teacher = self.strings[record[5]]
+            event.location = self.strings[record[6]]
+            event.exceptional = self.strings[record[7]]
+            events.append(event)
+        records.close()  # Closes the file now rather than when the generator is collected
+        return events
+
+    def update(self, events, source=0):
+        """
+        Merge a sync of source into the store: its stored events that start
+        within the span of events are replaced by events, the others and those
+        of other sources are kept. The file is rewritten record by record, so
+        the store never has to fit in RAM.
+        """
+        if not events:
+            return
+        events = sorted(events, key=lambda event: (event.start, event.end))
+        first, last = events[0].start, events[-1].start
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                writer = StoreWriter(file)
+                new = iter(events)
+                pending = next(new)
+                # The kept records in start order, with the new ones slotted in between
+                for old in self.records():
+                    if old[3] == source and first <= old[0] <= last:
+                        continue
+                    while pending is not None and (pending.start, pending.end) < (old[0], old[1]):
+                        writer.add_event(pending, source)
+                        pending = next(new, None)
+                    writer.add(old[0], old[1], old[2], old[3], *[self.strings[number] for number in old[4:]])
+                while pending is not None:
+                    writer.add_event(pending, source)
+                    pending = next(new, None)
+                writer.finish()  # Only the strings the records still use are written back
+        except Exception:
+            try:
+                os.remove(temp_path)  # Half written, the store itself is untouched
+            except OSError:
+                pass
+            raise
+
+        try:
+            os.remove(self.path)  # FAT cannot rename over an existing file
+        except OSError:
+            pass
+        os.rename(temp_path, self.path)
+        self.load()
@@ -0,0 +1,83 @@
+import struct
+import binascii
+from array import array
+
+# Font container, built by tools/build_font.py, all little-endian:
+#   header   magic, glyph width, glyph height, flags, range count, glyph count, glyph of missing characters
+#   ranges   (first code point, count, first glyph) sorted by code point: code points
+#            first..first+count-1 are glyphs first glyph onwards
+#   offsets  with RLE only, glyph count + 1 offsets into the glyph data
+#   glyphs   height rows of (width + 7) // 8 bytes each, PackBits-compressed per glyph with RLE
+HEADER = "<4sBBBxHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+MAGIC = b"FNT1"
+RLE = 0x01
+
+def unpack_bits(data, size):
+    """Decode PackBits: n < 128 copies the next n + 1 bytes, n > 128 repeats the next byte 257 - n times."""
+    out = bytearray(size)
+    i = j = 0
+    while j < size:
+        n = data[i]
+        if n < 128:
+            out[j:j + n + 1] = data[i + 1:i + n + 2]
+            i += n + 2
+            j += n + 1
+        else:
+            for k in range(257 - n):
+                out[j + k] = data[i + 1]
+            i += 2
+            j += 257 - n
+    return bytes(out)
+
+class Font:
+    """
+    A bitmap font container. Only the header and the index stay in RAM;
+    glyph() reads and decodes a single glyph, so a screen only pays for
+    the characters it shows (DisplayDriver caches them).
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            magic, self.width, self.height, flags, range_count, glyph_count, self.missing = struct.unpack(HEADER, file.read(HEADER_SIZE))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a font container")
+            self.ranges = array("H", file.read(6 * range_count))  # First, count, first glyph, first...
+            self.rle = flags & RLE
+            self.offsets = array("H", file.read(2 * (glyph_count + 1))) if self.rle else None
+            # CRC32 of the whole file, so caches of drawn text (lib/snapshot_cache.py) notice a rebuilt font
+            self.crc = 0
+            file.seek(0)
+            buf = bytearray(256)
+            while True:
+                count = file.readinto(buf)
+                if not count:
+                    break
+                self.crc = binascii.crc32(memoryview(buf)[:count], self.crc)
+        self.glyph_size = self.height * ((self.width + 7) // 8)
+        self.data_start = HEADER_SIZE + 6 * range_count + (2 * (glyph_count + 1) if self.rle else 0)
+
+    def index(self, code):
+        """Glyph number of code point code, by binary search over the ranges; the missing glyph if there is none."""
+        low, high = 0, len(self.ranges) // 3
+        while low < high:
+            middle = (low + high) // 2
+            if self.ranges[3 * middle] <= code:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            first, count, glyph = self.ranges[3 * low - 3:3 * low]
+            if code < first + count:
+                return glyph + code - first
+        return self.missing
+
+    def glyph(self, char):
+        """The row bytes of char."""
+        index = self.index(ord(char))
+        with open(self.path, "rb") as file:
+            if self.rle:
+                file.seek(self.data_start + self.offsets[index])
+                return unpack_bits(file.read(self.offsets[index + 1] - self.offsets[index]), self.glyph_size)
+            file.seek(self.data_start + index * self.glyph_size)
+            return file.read(self.glyph_size)
@@ -0,0 +1,400 @@
+import io
+import socket
+import time
+
+try:
+    import deflate
+except ImportError:
+    deflate = None  # Before MicroPython 1.21 feeds are fetched uncompressed
+
+# deflate.DeflateIO keeps a window of 2**GZIP_WBITS bytes. Servers compress with
+# the full 32 KB window, a smaller one fails on the first long back-reference.
+GZIP_WBITS = 15
+
+# Keep-alive: a connection whose response was read to the end waits in the pool
+# for the next request to the same host. Servers drop idle connections after
+# some seconds, and a stale one costs a failed request, so they are not kept long.
+IDLE_MS = 20000
+DRAIN_LIMIT = 4096  # Unread body bytes worth reading away to keep the connection
+
+_idle = {}  # (scheme, host, port) -> (Stream, ticks_ms when it was released)
+_sessions = {}  # host -> TLS session of the last connection, for an abbreviated handshake
+_context = None
+
+class Stream:
+    """
+    A socket read through a small buffer, for the status line, headers and chunk sizes.
+
+    readinto() hands out the buffered bytes first and then reads straight
+    into the caller's buffer, so the body is only copied once.
+    """
+    def __init__(self, sock, size=256):
+        # CPython sockets are not streams, MicroPython ones are
+        self.sock = sock
+        self.raw = sock if hasattr(sock, "readinto") else sock.makefile("rwb", 0)
+        self.key = None  # (scheme, host, port), set by connect()
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.discard = False  # The line last returned was cut, the rest of it is read away first
+
+    def write(self, data):
+        view = memoryview(data)
+        while len(view):
+            written = self.raw.write(view)
+            view = view[written or len(view):]
+
+    def readinto(self, buf):
+        if self.start == self.end and len(buf) < len(self.buf):
+            # Small reads, like deflate.DeflateIO's single bytes, go through the buffer
+            self.start = 0
+            self.end = self.raw.readinto(self.buf) or 0
+        if self.start < self.end:
+            count = min(len(buf), self.end - self.start)
+            buf[:count] = self.mv[self.start:self.start + count]
+            self.start += count
+            return count
+        return self.raw.readinto(buf) or 0
+
+    def readline(self):
+        """
+        The next line up to and including b"\\n" as a memoryview into the buffer, valid until the next call.
+        A line longer than the buffer (a long cookie, say) comes back cut to its first part.
+        """
+        while self.discard:
+            for i in range(self.start, self.end):
+                if self.buf[i] == 0x0A:
+                    self.start = i + 1
+                    self.discard = False
+                    break
+            else:
+                self.start = 0
+                self.end = self.raw.readinto(self.buf) or 0
+                if not self.end:
+                    self.discard = False
+        while True:
+            for i in range(self.start, self.end):
+                if self.buf[i] == 0x0A:
+                    line = self.mv[self.start:i + 1]
+                    self.start = i + 1
+                    return line
+            if self.start > 0:
+                self.buf[:self.end - self.start] = self.mv[self.start:self.end]
+                self.end -= self.start
+                self.start = 0
+            if self.end == len(self.buf):
+                self.discard = True
+                self.start = self.end
+                return self.mv[:self.end]
+            count = self.raw.readinto(self.mv[self.end:])
+            if not count:
+                line = self.mv[self.start:self.end]
+                self.start = self.end
+                return line
+            self.end += count
+
+    def close(self):
+        # Ports with TLS sessions only hand out the ticket once data came in
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            _sessions[self.key[1]] = session
+        self.raw.close()
+        if self.raw is not self.sock:
+            self.sock.close()
+
+class LengthBody(io.IOBase):
+    """A body of known length, or one that runs until the connection closes when length is None."""
+    def __init__(self, stream, length=None):
+        self.stream = stream
+        self.remaining = length
+
+    def readinto(self, buf):
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return 0
+            if len(buf) > self.remaining:
+                buf = memoryview(buf)[:self.remaining]
+        count = self.stream.readinto(buf)
+        if self.remaining is not None:
+            if not count:
+                raise OSError("Connection closed in the middle of the body")
+            self.remaining -= count
+        return count
+
+    def read(self, size):
+        buf = bytearray(size)
+        return bytes(memoryview(buf)[:self.readinto(buf)])
+
+    def drain(self, limit):
+        """Read away the rest of the body if it is at most limit bytes; whether it is now complete."""
+        if self.remaining is None or self.remaining > limit:
+            return False
+        buf = bytearray(256)
+        while self.remaining:
+            self.readinto(buf)
+        return True
+
+class ChunkedBody(io.IOBase):
+    """A body sent with Transfer-Encoding: chunked, decoded as it is read."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.remaining = 0  # Bytes left in the current chunk
+        self.done = False
+
+    def readinto(self, buf):
+        if self.remaining == 0:
+            if self.done:
+                return 0
+            line = self.stream.readline()
+            if not len(line):
+                raise OSError("Connection closed before the last chunk")
+            size = 0
+            for byte in line:
+                digit = byte - 0x30 if byte <= 0x39 else (byte | 0x20) - 0x57
+                if not 0 <= digit < 16:
+                    break  # End of the hex size, or start of a chunk extension
+                size = size * 16 + digit
+            if size == 0:
+                # Last chunk: skip the trailers up to the empty line
+                while len(self.stream.readline()) > 2:
+                    pass
+                self.done = True
+                return 0
+            self.remaining = size
+        if len(buf) > self.remaining:
+            buf = memoryview(buf)[:self.remaining]
+        count = self.stream.readinto(buf)
+        if not count:
+            raise OSError("Connection closed in the middle of a chunk")
+        self.remaining -= count
+        if self.remaining == 0:
+            self.stream.readline()  # CRLF after the chunk data
+        return count
+
+    def read(self, size):
+        buf = bytearray(size)
+        return bytes(memoryview(buf)[:self.readinto(buf)])
+
+    def drain(self, limit):
+        """Read away up to limit bytes of the rest of the body; whether it is now complete."""
+        buf = bytearray(256)
+        while not self.done and limit > 0:
+            limit -= self.readinto(buf)
+        return self.done
+
+class LineReader:
+    """
+    Lines of a body, read with readinto() into one preallocated buffer.
+
+    readline() returns a memoryview into the buffer instead of a new bytes
+    object; it stays valid until the next call. Unread bytes are moved to
+    the front of the buffer before it is refilled, so a line is always in
+    one piece. A line longer than the buffer comes back in buffer-sized parts.
+    """
+    def __init__(self, body, size=2048):
+        self.body = body
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.line_start = 0
+        self.line_end = 0
+        self.eof = False
+        # bytearray.find is missing on some MicroPython builds, readline() then scans in Python
+        self.find = getattr(self.buf, "find", None)
+
+    def fill(self):
+        if self.start > 0:
+            self.buf[:self.end - self.start] = self.mv[self.start:self.end]
+            self.end -= self.start
+            self.start = 0
+        count = self.body.readinto(self.mv[self.end:])
+        if not count:
+            self.eof = True
+        self.end += count
+
+    def readline(self):
+        """The next line including its b"\\n", empty at the end of the body."""
+        scanned = self.start
+        while True:
+            if self.find:
+                newline = self.find(b"\n", scanned, self.end)
+            else:
+                newline = -1
+                for i in range(scanned, self.end):
+                    if self.buf[i] == 0x0A:
+                        newline = i
+                        break
+            if newline >= 0 or self.eof or (self.start == 0 and self.end == len(self.buf)):
+                end = newline + 1 if newline >= 0 else self.end
+                self.line_start = self.start
+                self.line_end = end
+                self.start = end
+                return self.mv[self.line_start:end]
+            scanned = self.end - self.start
+            self.fill()
+
+    def startswith(self, prefix, offset=0):
+        """Whether the line last returned by readline() has prefix at offset (its start by default), without copying it."""
+        start = self.line_start + offset
+        if self.line_end - start < len(prefix) or self.buf[start] != prefix[0]:
+            return False  # Most lines already differ in their first byte
+        buf = self.buf
+        for i in range(1, len(prefix)):
+            if buf[start + i] != prefix[i]:
+                return False
+        return True
+
+    def skip(self, count):
+        """Drop count bytes of the body, reusing the buffer. Returns how many were dropped."""
+        skipped = min(count, self.end - self.start)
+        self.start += skipped
+        while skipped < count and not self.eof:
+            self.start = self.end = 0
+            self.fill()
+            step = min(count - skipped, self.end)
+            self.start = step
+            skipped += step
+        return skipped
+
+class Response:
+    def __init__(self, stream, status_code, headers, body, framing=None, keep_alive=False):
+        self.stream = stream
+        self.status_code = status_code
+        self.headers = headers  # Lower-case names
+        self.body = body
+        self.framing = framing or body  # The Length or ChunkedBody under a DeflateIO
+        self.keep_alive = keep_alive
+
+    def lines(self, size=2048):
+        return LineReader(self.body, size)
+
+    def close(self):
+        """Give the connection back to the pool once the body is read to the end, otherwise close it."""
+        try:
+            complete = self.keep_alive and self.framing.drain(DRAIN_LIMIT)
+        except OSError:
+            complete = False
+        if complete:
+            release(self.stream)
+        else:
+            self.stream.close()
+
+def split_url(url):
+    """(scheme, host, port, path) of an http:// or https:// URL."""
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    port = 443 if scheme == "https" else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return scheme, host, port, slash + path if slash else "/"
+
+def tls_context():
+    """One SSLContext for every connection, its setup is not repeated per request."""
+    global _context
+    if _context is None:
+        import ssl
+        _context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if hasattr(_context, "check_hostname"):
+            _context.check_hostname = False  # CPython only
+        _context.verify_mode = ssl.CERT_NONE  # As urequests did, certificates are not checked
+    return _context
+
+def connect(scheme, host, port):
+    address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+    sock = socket.socket()
+    sock.connect(address)
+    if scheme == "https":
+        if host in _sessions:
+            # Only ports whose sockets have a session attribute ever store one
+            sock = tls_context().wrap_socket(sock, server_hostname=host, session=_sessions[host])
+        else:
+            sock = tls_context().wrap_socket(sock, server_hostname=host)
+    stream = Stream(sock)
+    stream.key = (scheme, host, port)
+    return stream
+
+def release(stream):
+    """Keep stream for the next request to its host, in place of an older idle one."""
+    previous = _idle.pop(stream.key, None)
+    if previous is not None:
+        previous[0].close()
+    _idle[stream.key] = (stream, time.ticks_ms())
+
+def take_idle(key):
+    """An idle connection to key that is recent enough to still be open, or None."""
+    entry = _idle.pop(key, None)
+    if entry is None:
+        return None
+    stream, released = entry
+    if time.ticks_diff(time.ticks_ms(), released) > IDLE_MS:
+        stream.close()
+        return None
+    return stream
+
+def close_idle():
+    """Close the pooled connections, e.g. before Wi-Fi goes down."""
+    while _idle:
+        _idle.popitem()[1][0].close()
+
+def read_response(stream):
+    status = stream.readline()
+    if len(status) < 12:
+        raise OSError("No HTTP response")
+    status_code = int(str(status[9:12], "utf-8"))
+    http_11 = str(status[:8], "utf-8") == "HTTP/1.1"
+    headers = {}
+    while True:
+        line = stream.readline()
+        if len(line) <= 2:
+            break
+        if stream.discard:
+            continue  # Cut, its value would be wrong anyway
+        name, _, value = str(line, "utf-8").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", ""):
+        body = ChunkedBody(stream)
+    elif "content-length" in headers:
+        body = LengthBody(stream, int(headers["content-length"]))
+    else:
+        body = LengthBody(stream)
+    # Without a length or chunks the body ends when the server closes the connection
+    keep_alive = (http_11 and "close" not in headers.get("connection", "")
+                  and not (isinstance(body, LengthBody) and body.remaining is None))
+    framing = body
+    if deflate and headers.get("content-encoding") == "gzip":
+        # Inflated as it is read; the io.IOBase bodies are streams DeflateIO can pull from
+        body = deflate.DeflateIO(body, deflate.GZIP, GZIP_WBITS)
+    return Response(stream, status_code, headers, body, framing, keep_alive)
+
+def get(url, headers=None, accept_gzip=False):
+    """
+    Send a GET request and return the Response once its headers are in; the body is read from response.body.
+
+    With accept_gzip the server may compress the body when the firmware has
+    the deflate module; response.body then gives the inflated bytes.
+    """
+    scheme, host, port, path = split_url(url)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if accept_gzip and deflate:
+        request += "Accept-Encoding: gzip\r\n"
+    for name, value in (headers or {}).items():
+        request += f"{name}: {value}\r\n"
+    request = (request + "\r\n").encode()
+
+    stream = take_idle((scheme, host, port))
+    if stream is not None:
+        try:
+            stream.write(request)
+            return read_response(stream)
+        except OSError:
+            stream.close()  # The server closed the idle connection in the meantime, open a new one
+    stream = connect(scheme, host, port)
+    try:
+        stream.write(request)
+        return read_response(stream)
+    except Exception:
+        stream.close()
+        raise
@@ -0,0 +1,217 @@
+import time
+import json
+from array import array
+from lib.display_profiler import unwrap_pin
+
+# Log-linear histogram: buckets 0-3 are 64 us wide, then four buckets per
+# doubling, so a bucket's bounds are within 19% of each other up to ~8 s
+BUCKETS = 64
+UNIT_SHIFT = 6  # 64 us
+
+# Fields of a trace in the ring of recent ones: the button's and the state's
+# index in LatencyTracer.keys, then times in us from the button edge
+BUTTON = 0
+STATE = 1
+QUEUED = 2     # The render loop picked the button up
+NAVIGATED = 3  # State.navigate returned
+PHOTON = 4     # The last pixel of the redraw was written
+TRACE_FIELDS = ("button", "state", "queued_us", "navigated_us", "photon_us")
+
+def bucket(us):
+    """Histogram bucket of a latency in us."""
+    value = us >> UNIT_SHIFT
+    if value < 4:
+        return value
+    shift = 0
+    while value >= 8:
+        value >>= 1
+        shift += 1
+    return min(BUCKETS - 1, 4 + 4 * shift + value - 4)
+
+def bucket_limit(index):
+    """Upper bound in us of the latencies in bucket index."""
+    if index < 4:
+        return (index + 1) << UNIT_SHIFT
+    shift, step = divmod(index - 4, 4)
+    return (5 + step) << shift << UNIT_SHIFT
+
+class _StampingPin:
+    """Wraps the CS pin so the end of every bus transaction is timestamped."""
+    def __init__(self, pin, tracer):
+        self.pin = pin
+        self.tracer = tracer
+
+    def off(self):
+        self.pin.off()
+
+    def on(self):
+        self.pin.on()
+        self.tracer.last_write_us = time.ticks_us()
+
+    def value(self, *args):
+        result = self.pin.value(*args)
+        if args and args[0]:
+            self.tracer.last_write_us = time.ticks_us()
+        return result
+
+class LatencyTracer:
+    """
+    Opt-in input-to-photon latency tracing.
+
+    ButtonManager timestamps every button edge; a traced press runs from
+    the release edge that fires the button, through the render queue and
+    State.navigate, to the end of the last bus transaction of the redraw,
+    when its last pixel is in display RAM (the panel scans it out within
+    one refresh, ~14 ms, which is not included).
+
+    Latencies are kept per button and per state (the one that handled the
+    button) as log-linear histograms in preallocated arrays, and the stages
+    of the last TRACES traces in a ring, so recording a trace allocates
+    nothing.
+    percentiles() gives p50, p95 and max on demand; like DisplayProfiler,
+    nothing is patched until enable() is called.
+    """
+    TRACES = 32
+
+    def __init__(self, display, buttons=(), states=()):
+        self.display = display
+        self.enabled = False
+        self.keys = list(buttons) + list(states)
+        self.indexes = {key: index for index, key in enumerate(self.keys)}
+        self.histograms = [array("H", bytes(2 * BUCKETS)) for _ in self.keys]
+        self.maxima = array("I", bytes(4 * len(self.keys)))
+        self.ring = array("I", bytes(4 * self.TRACES * len(TRACE_FIELDS)))
+        self.traced = 0
+        self.no_redraw = 0  # Presses that did not draw anything
+        self.last_write_us = 0
+        self._pin = None
+        self._edge_us = None
+        self._queued_us = 0
+
+    def enable(self):
+        """Start timestamping the display's bus transactions."""
+        if self.enabled:
+            return
+        self._pin = self.display.cs = _StampingPin(self.display.cs, self)
+        self.enabled = True
+
+    def disable(self):
+        """Take the wrapper off the CS pin, wherever it sits under other wrappers (DisplayProfiler's)."""
+        if not self.enabled:
+            return
+        unwrap_pin(self.display, "cs", self._pin)
+        self._pin = None
+        self.enabled = False
+
+    def reset(self):
+        """Drop every recorded latency."""
+        for index, histogram in enumerate(self.histograms):
+            for bucket_index in range(BUCKETS):
+                histogram[bucket_index] = 0
+            self.maxima[index] = 0
+        self.traced = 0
+        self.no_redraw = 0
+
+    def begin(self, edge_us):
+        """The render loop picked up a button whose edge was at edge_us (time.ticks_us)."""
+        if not self.enabled or edge_us is None:
+            return
+        self._edge_us = edge_us
+        self._queued_us = time.ticks_diff(time.ticks_us(), edge_us)
+        self.last_write_us = None
+
+    def end(self, button_id, state):
+        """
+        navigate() returned: file the trace under button_id and the name of
+        the state that handled it. Only the keys given to the constructor
+        have a histogram, others are left out.
+        """
+        edge_us = self._edge_us
+        if not self.enabled or edge_us is None:
+            return
+        self._edge_us = None
+        navigated = time.ticks_diff(time.ticks_us(), edge_us)
+        if self.last_write_us is None:
+            self.no_redraw += 1
+            return
+        photon = time.ticks_diff(self.last_write_us, edge_us)
+        button_index = self.indexes.get(button_id)
+        state_index = self.indexes.get(state)
+        if button_index is None or state_index is None:
+            return
+        self._record(button_index, photon)
+        self._record(state_index, photon)
+
+        base = (self.traced % self.TRACES) * len(TRACE_FIELDS)
+        ring = self.ring
+        ring[base + BUTTON] = button_index
+        ring[base + STATE] = state_index
+        ring[base + QUEUED] = self._queued_us
+        ring[base + NAVIGATED] = navigated
+        ring[base + PHOTON] = photon
+        self.traced += 1
+
+    def _record(self, index, latency):
+        histogram = self.histograms[index]
+        bucket_index = bucket(latency)
+        if histogram[bucket_index] < 0xFFFF:
+            histogram[bucket_index] += 1
+        if latency > self.maxima[index]:
+            self.maxima[index] = latency
+
+    def percentiles(self, key):
+        """(p50, p95, max) latency in us of key, a button or state name, or None before its first trace."""
+        index = self.indexes[key]
+        histogram = self.histograms[index]
+        count = sum(histogram)
+        if not count:
+            return None
+        result = []
+        for fraction in (50, 95):
+            target = (count * fraction + 99) // 100
+            seen = 0
+            for bucket_index in range(BUCKETS):
+                seen += histogram[bucket_index]
+                if seen >= target:
+                    # The bucket bound, but never above the largest latency seen
+                    result.append(min(bucket_limit(bucket_index), self.maxima[index]))
+                    break
+        result.append(self.maxima[index])
+        return tuple(result)
+
+    def recent(self):
+        """The traces in the ring, oldest first, as dictionaries of TRACE_FIELDS."""
+        traces = []
+        for number in range(max(0, self.traced - self.TRACES), self.traced):
+            base = (number % self.TRACES) * len(TRACE_FIELDS)
+            trace = dict(zip(TRACE_FIELDS, self.ring[base:base + len(TRACE_FIELDS)]))
+            trace["button"] = self.keys[trace["button"]]
+            trace["state"] = self.keys[trace["state"]]
+            traces.append(trace)
+        return traces
+
+    def snapshot(self):
+        """Return the percentiles of every traced key and the recent traces as plain dictionaries."""
+        result = {"no_redraw": self.no_redraw, "latency": {}, "recent": []}
+        for index, key in enumerate(self.keys):
+            stats = self.percentiles(key)
+            if stats is not None:
+                result["latency"][key] = {"count": sum(self.histograms[index]), "p50_us": stats[0],
+                                          "p95_us": stats[1], "max_us": stats[2]}
+        result["recent"] = self.recent()
+        return result
+
+    def save(self, path="/latency.json"):
+        """Write the snapshot to the file system as JSON."""
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file)
+
+    def report(self):
+        """Print the latency percentiles per button and per state in ms, for use from the REPL."""
+        print(f"  {'':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for index, key in enumerate(self.keys):
+            stats = self.percentiles(key)
+            if stats is not None:
+                print(f"  {key:<16}{sum(self.histograms[index]):>8}" + "".join(f"{value / 1000:>10.1f}" for value in stats))
+        if self.no_redraw:
+            print(f"  {self.no_redraw} presses drew nothing")
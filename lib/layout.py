@@ -0,0 +1,71 @@
+from heapq import heappush, heappop
+from lib.event_store import day_key
+from lib.pronote import time_minutes, time_weekday
+
+def assign_columns(intervals):
+    """
+    Lay out (start, end, item) intervals side by side with a sweep line.
+
+    Returns [start, end, column, columns, item] lists in start order: an
+    interval takes the lowest column free at its start, and every interval
+    of a cluster (a run of intervals linked by overlaps) gets the cluster's
+    column count, so they all share the width evenly. Sorting dominates, the
+    sweep itself keeps the running intervals and free columns in heaps:
+    O(n log n) for n intervals.
+    """
+    placed = []
+    running = []  # (end, column) of the intervals under the sweep line
+    free = []     # Columns of the current cluster whose interval has ended
+    columns = 0
+    cluster = 0   # Index in placed of the current cluster's first interval
+    for start, end, item in sorted(intervals, key=lambda interval: (interval[0], -interval[1])):
+        while running and running[0][0] <= start:
+            heappush(free, heappop(running)[1])
+        if not running:
+            # Nothing left under the sweep line, the previous cluster is complete
+            for box in placed[cluster:]:
+                box[3] = columns
+            cluster = len(placed)
+            free = []
+            columns = 0
+        if free:
+            column = heappop(free)
+        else:
+            column = columns
+            columns += 1
+        heappush(running, (end, column))
+        placed.append([start, end, column, 0, item])
+    for box in placed[cluster:]:
+        box[3] = columns
+    return placed
+
+def day_boxes(events, weekday, x, y, width, height, first_minute, last_minute, min_height=4):
+    """
+    Pixel rectangles (x, y, width, height, event) for events, the events of
+    one day of a week (weekday 0 is Monday), in a column of the given pixel
+    bounds that covers first_minute to last_minute. Events are clipped to
+    the column and get at least min_height pixels; those running at the same
+    time share its width. An event running over several days covers the
+    whole column on the days between its first and last, and on all of them
+    when it lasts a week or more.
+    """
+    span = last_minute - first_minute
+    min_minutes = (min_height * span + height - 1) // height
+    intervals = []
+    for event in events:
+        within_week = day_key(event.end) - day_key(event.start) < 7
+        start = time_minutes(event.start) if within_week and time_weekday(event.start) == weekday else 0
+        end = time_minutes(event.end) if within_week and time_weekday(event.end) == weekday else 24 * 60
+        # Outside the hours shown, an event keeps a sliver at the edge rather than vanishing
+        start = min(max(start, first_minute), last_minute - min_minutes)
+        end = min(max(end, start + min_minutes), last_minute)
+        intervals.append((start, end, event))
+
+    boxes = []
+    for start, end, column, columns, event in assign_columns(intervals):
+        top = y + (start - first_minute) * height // span
+        left = x + column * width // columns
+        # One pixel between neighbouring columns
+        right = x + (column + 1) * width // columns - (column + 1 < columns)
+        boxes.append((left, top, right - left, y + (end - first_minute) * height // span - top, event))
+    return boxes
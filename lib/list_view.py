@@ -0,0 +1,72 @@
+class ListView:
+    """
+    A scrolling list with a cursor, drawn into rows of a Console.
+
+    Items are not stored: source(index) returns the (text, color) of one item
+    and is only asked for items that scroll into view. The view keeps one
+    [index, text, color] entry per visible row and reuses them as the list
+    scrolls, so memory and drawing depend on the number of visible rows and
+    not on count. The console then sends only the cells that changed.
+    """
+    def __init__(self, console, count, source, first_row=0, height=None):
+        """
+        :param console: Console to draw into.
+        :param count: Number of items.
+        :param source: Function returning (text, color) for an item index.
+        :param first_row: Console row of the first visible item.
+        :param height: Number of visible items, by default down to the last console row.
+        """
+        self.console = console
+        self.count = count
+        self.source = source
+        self.first_row = first_row
+        self.height = console.rows - first_row if height is None else height
+        self.top = 0
+        self.selected = 0
+        self.rows = [[-1, "", 0] for _ in range(self.height)]
+        self.scroll_to(0)
+
+    def set_count(self, count):
+        """Reload the visible items after the data behind source changed."""
+        self.count = count
+        for row in self.rows:
+            row[0] = -1
+        self.scroll_to(max(0, min(self.top, count - self.height)))
+        self.select(self.selected)
+
+    def scroll_to(self, top):
+        """Show items from top on, asking source only for the ones not already in view."""
+        shift = top - self.top
+        self.top = top
+        if 0 < abs(shift) < self.height:
+            # Rows still in view keep their entries, the others are recycled for the new items
+            self.rows = self.rows[shift:] + self.rows[:shift]
+        for slot, row in enumerate(self.rows):
+            index = top + slot
+            if row[0] != index:
+                row[0] = index
+                if index < self.count:
+                    row[1], row[2] = self.source(index)
+            self.draw_row(slot)
+
+    def select(self, index):
+        """Move the cursor to index, scrolling as little as needed, and flush the console."""
+        index = max(0, min(self.count - 1, index))
+        previous = self.selected
+        self.selected = index
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.height:
+            self.scroll_to(index - self.height + 1)
+        else:
+            if self.top <= previous < self.top + self.height:
+                self.draw_row(previous - self.top)
+            self.draw_row(index - self.top)
+        self.console.flush()
+
+    def draw_row(self, slot):
+        index, text, color = self.rows[slot]
+        if index >= self.count:
+            self.console.write_line(self.first_row + slot, "")
+        else:
+            self.console.write_line(self.first_row + slot, ("> " if index == self.selected else "  ") + text, color)
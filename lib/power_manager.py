@@ -0,0 +1,177 @@
+from machine import Pin, lightsleep, deepsleep # type: ignore
+import machine # type: ignore
+import esp32 # type: ignore
+import time
+from lib import http_client
+
+def wake_on_pin(number):
+    """
+    Let pin number held low end light and deep sleep. The ESP32 port wakes
+    on the level of one pin (EXT0), set up through Pin.irq(wake=...), which
+    leaves the pin's edge IRQ as it is. Returns False if the port cannot.
+    """
+    try:
+        Pin(number).irq(trigger=Pin.WAKE_LOW, wake=machine.SLEEP | machine.DEEPSLEEP)
+    except (AttributeError, ValueError, OSError) as e:
+        print(f"Error setting the wake pin: {e}")
+        return False
+    return True
+
+def deep_sleep(time_ms, wake_pin):
+    """
+    Deep-sleep until time_ms passed (None for no timer) or wake_pin reads
+    low. The board then boots again, see main.py.
+    """
+    wake_on_pin(wake_pin)
+    # Pins set to hold keep their level through deep sleep
+    esp32.gpio_deep_sleep_hold(True)
+    if time_ms is None:
+        deepsleep()
+    else:
+        deepsleep(max(1, time_ms))
+
+class PowerManager:
+    """
+    Idle power management: backlight fades, panel sleep and CPU light sleep.
+
+    After the last button press the screen is LIT at full brightness, DIM
+    at the dim level after dim_ms, and DARK after off_ms: backlight off and
+    the panel in sleep mode (DISPOFF, SLPIN). The panel keeps its RAM while
+    asleep, so waking it needs no redraw. Brightness changes fade over
+    FADE_MS; 0 for dim_ms or off_ms skips that phase.
+
+    The render loop calls update() (under the display lock, it may send
+    panel commands) and then idle(), which light-sleeps the CPU until the
+    next deadline or a button press. The board wakes on one pin (see
+    wake_on_pin), so WAKE_BUTTON ends a light sleep right away and the
+    other buttons are polled: a light sleep lasts at most POLL_MS, and a
+    button held down when it ends counts as pressed. While the backlight
+    PWM would stop in light sleep, idle() only naps.
+
+    deep_ms after the screen went dark, deep_sleep_due() tells the
+    application to deep-sleep (it saves what the next start needs first);
+    only WAKE_BUTTON ends a deep sleep. 0 keeps the board in light sleep.
+    """
+    LIT = 0
+    DIM = 1
+    DARK = 2
+    FADE_MS = 400
+    FADE_STEP_MS = 20   # Fades move the duty this often
+    NAP_MS = 10         # Wait when light sleep is not possible, as the loop always did
+    MIN_SLEEP_MS = 20   # Shorter waits are not worth a light sleep
+    POLL_MS = 50        # Longest light sleep, shorter than a button press
+    WAKE_BUTTON = "SELECT_A"  # The button that wakes the board by itself
+
+    def __init__(self, display, buttons, brightness=100, dim=20, dim_ms=30000, off_ms=120000, deep_ms=600000):
+        """
+        :param display: DisplayDriver whose backlight and panel are managed
+        :param buttons: ButtonManager, its pins wake the board
+        :param brightness: Backlight level in percent while in use
+        :param dim: Backlight level in percent when dimmed
+        """
+        self.display = display
+        self.buttons = buttons
+        self.brightness = brightness
+        self.dim = dim
+        self.dim_ms = dim_ms
+        self.off_ms = off_ms
+        self.deep_ms = deep_ms
+        self.phase = self.LIT
+        self.last_input = time.ticks_ms()
+        self.fade_from = brightness
+        self.fade_to = brightness
+        self.fade_start = self.last_input
+        self.slept_ms = 0  # Time spent in light sleep, for the REPL
+        self.wakes = 0
+        self.can_wake = self.wake_on_button()
+        display.set_brightness(self.fade_to)
+
+    def wake_on_button(self):
+        """Let WAKE_BUTTON pressed (held low) end light and deep sleep. Returns False if the port cannot."""
+        return wake_on_pin(self.buttons.BUTTON_PINS[self.WAKE_BUTTON])
+
+    def activity(self):
+        """
+        A button was pressed: back to full brightness right away. Returns True
+        if the screen was dark, the press then only wakes it.
+        """
+        was_dark = self.phase == self.DARK
+        self.last_input = time.ticks_ms()
+        if self.display.panel_asleep:
+            self.display.wake_panel()
+        self.phase = self.LIT
+        self.fade_from = self.fade_to = self.brightness
+        self.display.set_brightness(self.brightness)
+        return was_dark
+
+    def target_phase(self, now):
+        idle = time.ticks_diff(now, self.last_input)
+        if self.off_ms and idle >= self.off_ms:
+            return self.DARK
+        if self.dim_ms and idle >= self.dim_ms:
+            return self.DIM
+        return self.LIT
+
+    def update(self):
+        """Move to the phase the idle time calls for and step a running fade. Runs on the render loop."""
+        now = time.ticks_ms()
+        phase = self.target_phase(now)
+        if phase != self.phase:
+            self.phase = phase
+            self.fade_from = self.display.brightness
+            self.fade_to = (self.brightness, self.dim, 0)[phase]
+            self.fade_start = now
+        if self.display.brightness != self.fade_to:
+            elapsed = min(time.ticks_diff(now, self.fade_start), self.FADE_MS)
+            self.display.set_brightness(self.fade_from + (self.fade_to - self.fade_from) * elapsed // self.FADE_MS)
+        elif self.phase == self.DARK and not self.display.panel_asleep:
+            self.display.sleep_panel()
+
+    def next_change_ms(self):
+        """Milliseconds until update() has something to do."""
+        if self.display.brightness != self.fade_to:
+            return self.FADE_STEP_MS
+        idle = time.ticks_diff(time.ticks_ms(), self.last_input)
+        if self.phase == self.LIT and self.dim_ms:
+            return max(0, self.dim_ms - idle)
+        if self.phase != self.DARK and self.off_ms:
+            return max(0, self.off_ms - idle)
+        if self.phase == self.DARK and self.deep_ms and self.can_wake:
+            return max(0, self.off_ms + self.deep_ms - idle)
+        return None
+
+    def deep_sleep_due(self):
+        """Whether the screen has been dark for deep_ms, and WAKE_BUTTON can wake the board from deep sleep."""
+        return (self.phase == self.DARK and self.display.panel_asleep and self.deep_ms and self.can_wake
+                and time.ticks_diff(time.ticks_ms(), self.last_input) >= self.off_ms + self.deep_ms)
+
+    def deep_sleep(self, time_ms=None):
+        """Turn the display off for good, hold its pins and deep-sleep. Does not return."""
+        if not self.display.panel_asleep:
+            self.display.sleep_panel()
+        self.display.set_brightness(0)
+        self.display.hold_pins(True)
+        deep_sleep(time_ms, self.buttons.BUTTON_PINS[self.WAKE_BUTTON])
+
+    def idle(self, timeout_ms=None, busy=False):
+        """
+        Wait for the next event: at most timeout_ms (None for no timer of
+        the caller's), or until a button press. busy (another thread or
+        queued work needs the CPU) keeps it to a nap. Light sleeps are cut
+        to POLL_MS, the buttons other than WAKE_BUTTON cannot end them.
+        """
+        wait = self.next_change_ms()
+        if timeout_ms is not None:
+            wait = timeout_ms if wait is None else min(wait, timeout_ms)
+        lit = self.display.brightness and not self.display.backlight_in_lightsleep
+        if busy or lit or (wait is not None and wait < self.MIN_SLEEP_MS):
+            time.sleep_ms(self.NAP_MS if wait is None else max(0, min(wait, self.NAP_MS)))
+            return
+        # Pooled HTTP connections would not survive the radio going quiet
+        http_client.close_idle()
+        start = time.ticks_ms()
+        lightsleep(self.POLL_MS if wait is None else min(wait, self.POLL_MS))
+        self.slept_ms += time.ticks_diff(time.ticks_ms(), start)
+        self.wakes += 1
+        # Edge IRQs are not delivered in light sleep, so pick up a press that woke the board or is held
+        self.buttons.resync()
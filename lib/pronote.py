@@ -1,26 +1,110 @@
-import urequests
+from lib import http_client
+from lib.event_store import EventStore, day_key
 import network
 import time
 import ntptime
 import os  # For file handling
 import json  # For JSON handling
 import gc  # For garbage collection
+import binascii
 from machine import Pin, SPI  # For SPI (if needed)
 import sys  # For system operations
+import _thread
 
 DEBUG = False
 
+# The VEVENT properties get_week_schedule keeps, by the first byte of their line; the
+# others are never decoded. Their name is followed by ":" or ";LANGUAGE=fr:".
+FIELDS = {
+    0x53: ((b"SUMMARY", "SUMMARY"),),
+    0x4C: ((b"LOCATION", "LOCATION"),),
+    0x43: ((b"CATEGORIES", "CATEGORIES"),),
+    0x44: ((b"DTSTART", "DTSTART"), (b"DTEND", "DTEND")),
+}
+LANGUAGE = b";LANGUAGE=fr:"
+
+# One calendar sync at a time, from any thread (see Pronote.update_calendar)
+SYNC_LOCK = _thread.allocate_lock()
+# Held while a sync rewrites CALENDAR_FILE or STORE_FILE, and while they are read
+FILE_LOCK = _thread.allocate_lock()
+
+def pack_time(year, yearday, weekday, hour, minute):
+    """
+    Pack a moment into one small int (29 bits, so no heap allocation on the ESP32):
+    years since 2000 (6 bits), day of the year (9), weekday (3), minute of the day (11).
+    Packed times sort in chronological order.
+    """
+    return ((year - 2000) << 23) | (yearday << 14) | (weekday << 11) | (hour * 60 + minute)
+
+def time_year(packed):
+    return 2000 + (packed >> 23)
+
+def time_yearday(packed):
+    return (packed >> 14) & 0x1FF
+
+def time_weekday(packed):
+    return (packed >> 11) & 0x7
+
+def time_minutes(packed):
+    """Minutes since midnight."""
+    return packed & 0x7FF
+
+def event_key(event):
+    """What the timetable shows of an event, for comparing weeks."""
+    return (event.start, event.end, event.subjectName, event.subjectColor, event.location, event.exceptional)
+
+def changed_days(old_week, new_week, days=7):
+    """Yield (day, keys) for every day whose events differ, keys holding the event_key of its new events."""
+    for day in range(days):
+        old_keys = [event_key(event) for event in old_week[day]]
+        new_keys = [event_key(event) for event in new_week[day]]
+        if old_keys != new_keys:
+            yield day, set(new_keys).difference(old_keys)
+
+def start_feed_thread(function, args=()):
+    """Run function in a new thread with the stack a feed download needs, Pronote.FEED_STACK."""
+    try:
+        previous = _thread.stack_size(Pronote.FEED_STACK)
+    except ValueError:
+        previous = None  # Below the port's minimum (CPython's), which is then enough
+    try:
+        _thread.start_new_thread(function, args)
+    finally:
+        if previous is not None:
+            _thread.stack_size(previous)
+
+def url_key(url):
+    """Key of a feed's validators in Pronote.load_validators, a CRC32 of its URL."""
+    return binascii.crc32(url.encode())
+
+def empty_week():
+    """A week as Pronote builds them: for each day from Monday, its events in start order."""
+    return [[] for _ in range(7)]
+
+def add_event(day_events, event):
+    """Insert event into a day's list, keeping start order."""
+    index = len(day_events)
+    while index and (day_events[index - 1].start, day_events[index - 1].end) > (event.start, event.end):
+        index -= 1
+    day_events.insert(index, event)
+
 class Event:
+    # MicroPython ignores __slots__; the savings there come from the packed times,
+    # the shared strings and not keeping the raw VEVENT text.
+    __slots__ = ("start", "end", "subjectID", "subjectName", "teacher", "location",
+                 "exceptional", "raw", "subjectColor", "source")
+
     def __init__(self):
-        self.start: str = ""
-        self.end: str = ""
+        self.start: int = 0  # pack_time() values
+        self.end: int = 0
         self.subjectID: int = 0
         self.subjectName: str = ""
         self.teacher: str = ""
         self.location: str = ""
         self.exceptional: str = ""
-        self.raw: str = ""
+        self.raw: str = ""  # Only filled in when DEBUG is set
         self.subjectColor: int = 0
+        self.source: int = 0  # Source.number of the feed it came from
 
     def to_dict(self):
         return {
@@ -33,13 +117,53 @@ class Event:
             "color": self.subjectColor
         }
 
+class Source:
+    """
+    One iCal feed shown on the board. Pronote feeds have their subjects mapped
+    through NAME_TO_ID and SUBJECT_MAPPINGS, other feeds (clubs, exams...)
+    keep their own subject names. color, when set, replaces the subject
+    colors of all the feed's events.
+    """
+    def __init__(self, number, name, url, color=None, pronote=True, start=0, end=1 << 30):
+        self.number = number  # Stored with its events in the event store
+        self.name = name
+        self.url = url
+        self.color = color
+        self.pronote = pronote
+        self.start = start  # Byte window of the feed that is parsed
+        self.end = end
+        self.etag = None  # Validators of the last download, so an unchanged feed is not parsed again
+        self.modified = None
+
 class Pronote:
     FIRST_HOUR = 8
     SLOTS_PER_DAY = 10
+    CALENDAR_FILE = "/calendar_data.json"
+    STORE_FILE = "/events.bin"  # Every synced event, for browsing other weeks offline
+    # Base URL of tools/week_proxy.py, e.g. "http://192.168.1.20:8089"; the feed is then parsed there
+    PROXY_URL = None
+    PROXY_WEEKS = 2  # Weeks downloaded per refresh from the proxy, from the current one on
+    ETAG_FILE = "/calendar.etag"
+    # Extra feeds, as [{"name": ..., "url": ..., "color": 0xRRGGBB, "pronote": false}, ...]
+    SOURCES_FILE = "/sources.json"
+    VALIDATORS_FILE = "/sources_state.json"
+    # Stack of a thread that downloads a feed: a TLS handshake needs more than the port's default
+    FEED_STACK = 12 * 1024
+    # Feeds are downloaded side by side while they fit in this much heap, at FEED_MEMORY each
+    # (TLS buffers, socket and line buffers, and the FEED_STACK of the thread that parses it)
+    SYNC_MEMORY = 128 * 1024
+    FEED_MEMORY = 24 * 1024 + FEED_STACK
+    FEED_URL = ("https://4040017y.index-education.net/pronote/ical/mesinformations.ics"
+                "?icalsecurise=4E45AB2EF84A44092FC2D98FEE5F3DC581D61639DF4EEB2A8AC8038AC8F98E12E30F26CB036CC97AE0CC7E4B787E3B64"
+                "&version=2024.3.8&param=266f3d32")
+    # Byte window of the feed that is parsed, the current term sits around here
+    FEED_START = 370000
+    FEED_END = 440000
     
     def __init__(self):
         # No SD card initialization
-        self.week = [[None for _ in range(self.SLOTS_PER_DAY)] for _ in range(7)]
+        self.week = empty_week()
+        self.validators = None  # Set by sync_sources, see load_validators
         # self.setup_spiffs()  # Remove SPIFFS setup
 
     def setup_spiffs(self):
@@ -50,7 +174,8 @@ class Pronote:
         except Exception as e:
             print(f"Failed to mount SPIFFS: {e}")
 
-    def convert_to_tuple(self, date_str):
+    def convert_to_time(self, date_str):
+        """Convert an iCal date-time (YYYYMMDDTHHMMSS) to a pack_time() value."""
         # Parse the date string
         year = int(date_str[0:4])
         month = int(date_str[4:6])
@@ -73,89 +198,143 @@ class Pronote:
             hour -= 24
             day += 1  # Adjust day if necessary
         
-        # Create a time tuple
+        # Create a time tuple to let the RTC work out the weekday and the day of the year
         time_tuple = (year, month, day, hour, minute, second, 0, 0, -1)  # weekday and yearday are placeholders
         
-        # Convert to timestamp and get the weekday and yearday
-        timestamp = time.mktime(time_tuple)
-        weekday = time.localtime(timestamp)[6]  # Get the weekday (0=Monday, 6=Sunday)
-        yearday = time.localtime(timestamp)[7]  # Get the day of the year
+        # Convert to timestamp and get the year (the shift can cross New Year), weekday and yearday
+        date = time.localtime(time.mktime(time_tuple))
         
-        # Return the complete tuple
-        return (year, month, day, hour, minute, second, weekday, yearday)
+        return pack_time(date[0], date[7], date[6], hour, minute)
+
+    def event_slots(self, event):
+        """First and last timetable slot of event, counted from 1."""
+        start_minutes = time_minutes(event.start)
+        end_minutes = time_minutes(event.end)
+        start_slot = max(1, min(self.SLOTS_PER_DAY, int((start_minutes // 60 + (start_minutes % 60 >= 30)) - self.FIRST_HOUR + 1)))
+        end_slot = max(1, min(self.SLOTS_PER_DAY, int((end_minutes // 60 + (end_minutes % 60 >= 30)) - self.FIRST_HOUR)))
+        return start_slot, end_slot
 
-    def get_week_schedule(self, url, day):
-        START_POS = 370000
-        END_POS = 440000
+    def get_week_schedule(self, url, day, on_event=None, on_progress=None, on_parsed=None, source=None):
+        """
+        Download and parse the week around day.
 
-        self.week = [[None for _ in range(self.SLOTS_PER_DAY)] for _ in range(7)]  # Reset week structure
+        on_event(day_index, event) is called as soon as a day of the week gets
+        an event and on_progress(done, total) after every parsed event, with
+        bytes of the feed window read so far, so callers can draw while the
+        rest is still downloading. on_parsed(event) gets every event of the
+        window, whichever week it is in.
+
+        With a Source, its byte window, subject mapping and color apply, its
+        validators are sent and updated, and None is returned when the feed
+        did not change.
+        """
+        START_POS = source.start if source else self.FEED_START
+        END_POS = source.end if source else self.FEED_END
+        headers = {}
+        if source and source.etag:
+            headers["If-None-Match"] = source.etag
+        if source and source.modified:
+            headers["If-Modified-Since"] = source.modified
+
+        self.week = empty_week()  # Reset week structure
         
-        today_weekday = day[6]
-        week_start = (day[0], day[1], day[2] - today_weekday, 0, 0, 0, 0, day[7] - today_weekday)
-        week_end = (day[0], day[1], day[2] + (6 - today_weekday), 23, 59, 59, 6, day[7] + (6 - today_weekday))
-        if DEBUG: print(f"Start: {week_start}, End: {week_end}")
+        # Day keys (event_store.day_key) of Monday to Sunday, so lessons of other years stay out.
+        # They are not consecutive numbers when the week spans New Year.
+        days = self.week_days(0, day)
+        first_day = days[0]
+        last_day = days[6]
+        if DEBUG: print(f"Days: {days}")
         
         # Define a list of weekday names
         WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         
         # Fetching
         if DEBUG: print("Fetching data... ", end='')
-        response = urequests.get(url)
+        response = http_client.get(url, headers, accept_gzip=True)
+        if response.status_code == 304:
+            response.close()
+            return None
+        if response.status_code != 200:
+            response.close()
+            raise OSError(f"Feed answered {response.status_code}")
+        if source:
+            source.etag = response.headers.get('etag')
+            source.modified = response.headers.get('last-modified')
         if DEBUG: print("Data fetched")
         
         if DEBUG: print("Parsing data... ")
-        total_length = int(response.headers.get('Content-Length', 0))
+        # 0 when the feed comes chunked; a gzip Content-Length is not the size of the text the window is in
+        total_length = 0 if 'content-encoding' in response.headers else int(response.headers.get('content-length', 0))
+        reader = response.lines()
         bytes_read = 0
+        window = max(1, (min(total_length, END_POS) if total_length else END_POS) - START_POS)
         
-        event_raw = ""
-        event_data = ""
+        # Of the event being read, reset by BEGIN:VEVENT
+        values = {}  # FIELDS name -> value bytes
+        field = None  # FIELDS name of the property line being read, None for the others
+        first = False  # On the first line after BEGIN:VEVENT, which is not parsed
+        complete = True  # Whether the last line ended, the reader cuts lines longer than its buffer
+        event_bytes = 0
         event = Event()
         read = False
+        strings = {}  # Per-refresh string table, so repeated teachers and rooms are stored once
         
-        # Skip bytes until START_POS
-        chunk = 16384
-        while bytes_read < START_POS:
-            if DEBUG: print(f"Skipping {bytes_read} / {total_length} bytes")
-            chunk_size = min(chunk, START_POS - bytes_read)
-            response.raw.read(chunk_size)
-            bytes_read += chunk_size
+        # Skip bytes until START_POS, through the reader's own buffer
+        if DEBUG: print(f"Skipping {START_POS} / {total_length} bytes")
+        bytes_read += reader.skip(START_POS)
 
         while True:
-            line = response.raw.readline()
-            if not line:
+            line = reader.readline()  # A view into the reader's buffer, only valid until the next readline
+            if not len(line):
                 break
             if bytes_read > END_POS:
                 break
             
-            # Parsing
+            # Parsing: only the kept properties are copied out of the buffer
             if read:
-                event_raw += line.decode('utf-8')
-            if line.startswith(b"BEGIN:VEVENT"):
+                stop = len(line)
+                event_bytes += stop
+                cut = not complete  # The rest of the last line
+                complete = line[stop - 1] == 0x0A
+                if complete:
+                    stop -= 2 if stop > 1 and line[stop - 2] == 0x0D else 1
+                if cut or line[0] == 0x20:
+                    # Folded lines go on after a space
+                    if field is not None:
+                        values[field] += bytes(line[0 if cut else 1:stop])
+                elif first:
+                    field = None
+                    first = False
+                else:
+                    field = None
+                    for prefix, name in FIELDS.get(line[0], ()):
+                        if reader.startswith(prefix):
+                            length = len(prefix)
+                            if length < stop and line[length] == 0x3A:  # ":"
+                                length += 1
+                            elif reader.startswith(LANGUAGE, length):
+                                length += len(LANGUAGE)
+                            else:
+                                break
+                            field = name
+                            values[name] = bytes(line[length:stop])
+                            break
+            if reader.startswith(b"BEGIN:VEVENT"):
                 read = True
-            if line.startswith(b"END:VEVENT"):
+                values = {}
+                field = None
+                first = True
+                complete = True
+                event_bytes = 0
+            if reader.startswith(b"END:VEVENT"):
                 read = False
-                bytes_read += len(event_raw)
+                bytes_read += event_bytes
                 
                 # Parsing event
-                lines = event_raw.splitlines()
-                event_lines = []
-                for line in lines[1:]:
-                    if line.startswith(' '):
-                        event_lines[-1] += line[1:]
-                    else:
-                        event_lines.append(line)
-                
-                event_data = '\n'.join(event_lines)
-                event_data = event_data.replace(";LANGUAGE=fr", "")
-                event_data = event_data.replace("Cours annulé : ", "")
-                event_data = event_data.replace("Prof. absent : ", "")
-                
-                # Parse event details using dictionary comprehension
-                event_details = {
-                    line.split(':', 1)[0]: line.split(':', 1)[1]
-                    for line in event_data.splitlines()
-                    if ':' in line
-                }
+                event_details = {}
+                for name, value in values.items():
+                    value = str(value, 'utf-8')
+                    event_details[name] = value.replace("Cours annulé : ", "").replace("Prof. absent : ", "")
                 
                 if 'SUMMARY' not in event_details:
                     continue
@@ -173,36 +352,44 @@ class Pronote:
                     if ' - ' in categories:
                         exceptional = categories.split(' - ')[1]
                 
-                event.subjectID = NAME_TO_ID.get(subject_name, 0)
-                event.subjectName = SUBJECT_MAPPINGS.get(event.subjectID, ("Unknown", '\033[38;5;245m'))[0]
-                event.location = event_details.get('LOCATION', "")
-                event.teacher = teacher
-                event.start = self.convert_to_tuple(event_details.get('DTSTART', "")) if event_details.get('DTSTART', "") != "" else (0, 0, 0, 0, 0, 0, 0, 0)
-                event.end = self.convert_to_tuple(event_details.get('DTEND', "")) if event_details.get('DTEND', "") != "" else (0, 0, 0, 0, 0, 0, 0, 0)
-                event.exceptional = exceptional
-                event.raw = event_data
+                if source and not source.pronote:
+                    event.subjectName = strings.setdefault(subject_name, subject_name)
+                else:
+                    event.subjectID = NAME_TO_ID.get(subject_name, 0)
+                    event.subjectName = SUBJECT_MAPPINGS.get(event.subjectID, ("Unknown", '\033[38;5;245m'))[0]
+                location = event_details.get('LOCATION', "")
+                event.location = strings.setdefault(location, location)
+                event.teacher = strings.setdefault(teacher, teacher)
+                event.start = self.convert_to_time(event_details.get('DTSTART', "")) if event_details.get('DTSTART', "") != "" else 0
+                event.end = self.convert_to_time(event_details.get('DTEND', "")) if event_details.get('DTEND', "") != "" else 0
+                event.exceptional = strings.setdefault(exceptional, exceptional)
+                if DEBUG: event.raw = repr(event_details)
                 event.subjectColor = SUBJECT_MAPPINGS.get(event.subjectID, ("Unknown", "#F5F5F5"))[1]
+                if source:
+                    event.source = source.number
+                    if source.color is not None:
+                        event.subjectColor = source.color
                 
-                # Calculate slots
-                start_slot = max(1, min(self.SLOTS_PER_DAY, int((event.start[3] + (event.start[4] >= 30)) - self.FIRST_HOUR + 1)))
-                end_slot = max(1, min(self.SLOTS_PER_DAY, int((event.end[3] + (event.end[4] >= 30)) - self.FIRST_HOUR)))
+                if on_parsed: on_parsed(event)
                 
-                if event.start[7] <= week_end[7] and event.end[7] >= week_start[7]:
+                start_day = day_key(event.start)
+                end_day = day_key(event.end)
+                
+                if start_day <= last_day and end_day >= first_day:
                     if DEBUG: print(f"Added: ({bytes_read} / {total_length}) {self.pad_string(event.subjectName[:15], 15)} {self.pad_string(event.teacher[:15], 15)} {self.pad_string(str(event.start), 32)} {self.pad_string(str(event.end), 32)} {self.pad_string(event.location[:3], 3)} {self.pad_string(event.exceptional[:15], 15)}")
                     # Add event to the week schedule
-                    for i in range(event.start[7], event.end[7] + 1):
-                        if i >= week_start[7] and i <= week_end[7]:
-                            day_index = (i+1) % 7  # Get the index for the day (0=Monday, 6=Sunday)
-                            for slot in range(start_slot, end_slot + 1):
-                                if self.week[day_index][slot - 1] is None:  # Adjust for 0-based index
-                                    self.week[day_index][slot - 1] = event
+                    for day_index in range(7):  # 0=Monday, 6=Sunday
+                        if start_day <= days[day_index] <= end_day:
+                            add_event(self.week[day_index], event)  # Overlapping events are all kept, see lib/layout.py
+                            if on_event: on_event(day_index, event)
                 else:
                     if DEBUG: print(f"({bytes_read} / {total_length}) {self.pad_string(event.subjectName[:15], 15)} {self.pad_string(event.teacher[:15], 15)} {self.pad_string(str(event.start), 32)} {self.pad_string(str(event.end), 32)} {self.pad_string(event.location[:3], 3)} {self.pad_string(event.exceptional[:15], 15)}")
                     
                 
+                if on_progress: on_progress(min(window, bytes_read - START_POS), window)
+                
                 event = Event()
-                event_data = ""
-                event_raw = ""
+        response.close()
         if DEBUG: print("Data parsed")
         return self.week
 
@@ -210,55 +397,330 @@ class Pronote:
         """Pad the string to the specified width."""
         return (s + ' ' * width)[:width]  # Pad and truncate to the width
 
+    def unpack_stored_time(self, value):
+        """Times in caches written before pack_time() are 8-tuples (stored as lists)."""
+        if isinstance(value, list):
+            return pack_time(value[0], value[7], value[6], value[3], value[4]) if value[0] else 0
+        return value
+
     def fetch_calendar(self):
-        """Fetch the calendar from the file system."""
-        try:
-            with open("/calendar_data.json", "r") as file:
-                calendar_data = json.load(file)
-                # Turn dictionaries back into Event objects
-                for day_index in range(len(calendar_data)):
-                    for slot_index in range(len(calendar_data[day_index])):
-                        event_dict = calendar_data[day_index][slot_index]
-                        if event_dict is not None:
-                            event = Event()
-                            event.subjectName = event_dict["subject"]
-                            event.teacher = event_dict["teacher"]
-                            event.location = event_dict["location"]
-                            event.exceptional = event_dict["exceptional"]
-                            event.start = event_dict["start"]
-                            event.end = event_dict["end"]
-                            event.subjectColor = event_dict["color"]
-                            calendar_data[day_index][slot_index] = event
-                return calendar_data
-        except OSError:
+        """Fetch the calendar from the file system, downloading it first if there is none."""
+        week = self.load_calendar()
+        if week is None:
             print("Calendar data not found. Updating calendar...")
             self.update_calendar()
-            
-        return self.fetch_calendar()
+            return self.fetch_calendar()
+        return week
+
+    def load_calendar(self):
+        """The stored week, or None if it was never downloaded."""
+        try:
+            with FILE_LOCK:
+                with open(self.CALENDAR_FILE, "r") as file:
+                    calendar_data = json.load(file)
+        except OSError:
+            return None
+        # Turn dictionaries back into Event objects. An event spanning several
+        # days is stored once per day but rebuilt as a single shared Event.
+        # Caches from before the layout engine hold a 7x10 grid of slots,
+        # with None in empty ones and an event once per slot it covers.
+        strings = {}
+        events = {}
+        week = empty_week()
+        for day_index in range(len(calendar_data)):
+            for event_dict in calendar_data[day_index]:
+                if event_dict is not None:
+                    start = self.unpack_stored_time(event_dict["start"])
+                    end = self.unpack_stored_time(event_dict["end"])
+                    key = (start, end, event_dict["subject"], event_dict["location"])
+                    event = events.get(key)
+                    if event is None:
+                        event = events[key] = Event()
+                        event.subjectName = strings.setdefault(event_dict["subject"], event_dict["subject"])
+                        event.teacher = strings.setdefault(event_dict["teacher"], event_dict["teacher"])
+                        event.location = strings.setdefault(event_dict["location"], event_dict["location"])
+                        event.exceptional = strings.setdefault(event_dict["exceptional"], event_dict["exceptional"])
+                        event.start = start
+                        event.end = end
+                        event.subjectColor = event_dict["color"]
+                    if event not in week[day_index]:
+                        add_event(week[day_index], event)
+        return week
+
+    def week_days(self, offset, day=None):
+        """
+        Day keys (event_store.day_key) of Monday to Sunday, offset weeks from
+        the week of day (a time.localtime() tuple, today by default).
+        """
+        now = day or time.localtime()
+        days = []
+        for weekday in range(7):
+            # Through mktime, so that weeks across New Year work
+            date = time.localtime(time.mktime((now[0], now[1], now[2] - now[6] + 7 * offset + weekday, 12, 0, 0, 0, 0, -1)))
+            days.append(day_key(pack_time(date[0], date[7], date[6], 0, 0)))
+        return days
 
-    def update_calendar(self):
-        """Update the calendar and save it to the file system."""
-        url = "https://4040017y.index-education.net/pronote/ical/mesinformations.ics"
-        url += "?icalsecurise=4E45AB2EF84A44092FC2D98FEE5F3DC581D61639DF4EEB2A8AC8038AC8F98E12E30F26CB036CC97AE0CC7E4B787E3B64"
-        url += "&version=2024.3.8&param=266f3d32"
+    def place_events(self, events, days, on_event=None):
+        """The week over days (from week_days) of events given in start order."""
+        week = empty_week()
+        for event in events:
+            for day_index in range(7):
+                if day_key(event.start) <= days[day_index] <= day_key(event.end):
+                    week[day_index].append(event)
+                    if on_event: on_event(day_index, event)
+        return week
+
+    def day_slots(self, events):
+        """The hour slots of a day's events: the first event over each slot, or None."""
+        slots = [None] * self.SLOTS_PER_DAY
+        for event in events:
+            start_slot, end_slot = self.event_slots(event)
+            for slot in range(start_slot - 1, end_slot):
+                if slots[slot] is None:
+                    slots[slot] = event
+        return slots
+
+    def load_week(self, offset):
+        """The week offset weeks from the current one, from the event store, in the load_calendar format."""
+        days = self.week_days(offset)
+        colors = self.source_colors()
+        with FILE_LOCK:
+            events = EventStore(self.STORE_FILE).events_between(days[0] << 14, (days[6] << 14) | 0x3FFF, colors)
+        return self.place_events(events, days)
+
+    def source_colors(self, sources=None):
+        """Source number to color, for the sources that have one."""
+        return {source.number: source.color for source in sources or self.load_sources() if source.color is not None}
+
+    def get_week_from_proxy(self, on_event=None):
+        """
+        This week and the next from tools/week_proxy.py, already parsed into
+        event store records; the current week, or None when the proxy
+        answers that nothing changed since the last download.
+        """
+        headers = {}
+        try:
+            os.stat(self.CALENDAR_FILE)
+            with open(self.ETAG_FILE) as file:
+                headers["If-None-Match"] = file.read()
+        except OSError:
+            pass  # First download, or the week it belongs to is gone
+
+        now = time.localtime()
+        response = http_client.get(f"{self.PROXY_URL}/weeks/{now[0]:04}{now[1]:02}{now[2]:02}?count={self.PROXY_WEEKS}", headers)
+        try:
+            if response.status_code == 304:
+                return None
+            if response.status_code != 200:
+                raise OSError(f"Proxy answered {response.status_code}")
+            # A few hundred bytes per week, saved as a small store of their own
+            blob_path = self.STORE_FILE + ".week"
+            buf = bytearray(256)
+            with open(blob_path, "wb") as file:
+                while True:
+                    count = response.body.readinto(buf)
+                    if not count:
+                        break
+                    file.write(memoryview(buf)[:count])
+        finally:
+            response.close()
+
+        blob = EventStore(blob_path)
+        events = blob.events_between(0, 0xFFFFFFFF)
+        os.remove(blob_path)
+        with FILE_LOCK:
+            EventStore(self.STORE_FILE).update(events)
+        week = self.place_events(events, self.week_days(0), on_event)
+        etag = response.headers.get("etag")
+        if etag:
+            with open(self.ETAG_FILE, "w") as file:
+                file.write(etag)
+        return week
+
+    def load_validators(self):
+        """Validators of the last download of each feed, url_key(url) -> (etag, modified); empty if none."""
+        try:
+            with open(self.VALIDATORS_FILE) as file:
+                return {url_key(url): tuple(value) for url, value in json.load(file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def load_sources(self, validators=None):
+        """
+        The Pronote feed, then the feeds of SOURCES_FILE, with the validators
+        of their last download: validators if given (see load_validators),
+        otherwise those of VALIDATORS_FILE.
+        """
+        sources = [Source(0, "Pronote", self.FEED_URL, None, True, self.FEED_START, self.FEED_END)]
+        try:
+            with open(self.SOURCES_FILE) as file:
+                for entry in json.load(file):
+                    sources.append(Source(len(sources), entry.get("name", ""), entry["url"], entry.get("color"),
+                                          entry.get("pronote", False), entry.get("start", 0), entry.get("end", 1 << 30)))
+        except OSError:
+            pass
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring {self.SOURCES_FILE}: {e}")
+        try:
+            # Only worth sending while the events they vouch for are still stored
+            os.stat(self.STORE_FILE)
+            os.stat(self.CALENDAR_FILE)
+        except OSError:
+            return sources
+        if validators is None:
+            validators = self.load_validators()
+        for source in sources:
+            source.etag, source.modified = validators.get(url_key(source.url), (None, None))
+        return sources
+
+    def sync_source(self, source, day, results, on_event=None, on_progress=None):
+        """Download and parse one source into results[source.number]: its events, or None when unchanged."""
+        parsed = []
+        try:
+            # A Pronote per source, get_week_schedule keeps its week in self.week
+            week = Pronote().get_week_schedule(source.url, day, on_event, on_progress, parsed.append, source)
+        except Exception as e:
+            print(f"Failed to sync {source.name}: {e}")
+            results[source.number] = e
+            return None
+        results[source.number] = None if week is None else parsed
+        return week
+
+    def sync_sources(self, on_event=None, on_progress=None, validators=None):
+        """
+        Sync every source into the event store and return the current week.
+
+        Sources are downloaded side by side, as many at a time as
+        SYNC_MEMORY allows, so a refresh takes about as long as the slowest
+        feed. The calling thread takes the Pronote feed first, with the
+        callbacks; worker threads take the others. Unchanged feeds are
+        skipped, their stored events stay as they are. The validators
+        afterwards are left in self.validators, see load_validators.
+        """
+        sources = self.load_sources(validators)
+        sent = [(source.etag, source.modified) for source in sources]
         day = time.localtime()
-        week_schedule = self.get_week_schedule(url, day)
+        results = {}
+        pending = sources[1:]
+        lock = _thread.allocate_lock()
+        running = [0]
+
+        def work():
+            while True:
+                with lock:
+                    if not pending:
+                        running[0] -= 1
+                        return
+                    source = pending.pop(0)
+                self.sync_source(source, day, results)
+
+        budget = self.SYNC_MEMORY
+        if hasattr(gc, "mem_free"):
+            budget = min(budget, gc.mem_free() // 2)
+        workers = min(len(pending), max(1, budget // self.FEED_MEMORY) - 1)
+        running[0] = workers + 1
+        for _ in range(workers):
+            start_feed_thread(work)
+        week = self.sync_source(sources[0], day, results, on_event, on_progress)
+        work()
+        while running[0]:
+            time.sleep_ms(20)
+
+        failures = [error for error in results.values() if isinstance(error, Exception)]
+        if len(failures) == len(sources):
+            raise failures[0]  # Nothing new and nothing known to be current, keep the stored week
+
+        store = EventStore(self.STORE_FILE)
+        validators = {}
+        for source in sources:
+            events = results[source.number]
+            if isinstance(events, Exception):
+                continue
+            try:
+                if events is not None:
+                    with FILE_LOCK:
+                        store.update(events, source.number)
+                validators[source.url] = (source.etag, source.modified)
+            except Exception as e:
+                print(f"Error saving the events of {source.name}: {e}")
+        self.validators = {url_key(url): value for url, value in validators.items()}
+        # Rewritten only when a feed changed, or failed and loses its entry
+        if len(validators) < len(sources) or any((source.etag, source.modified) != old for source, old in zip(sources, sent)):
+            try:
+                with open(self.VALIDATORS_FILE, "w") as file:
+                    json.dump(validators, file)
+            except OSError as e:
+                print(f"Error saving validators: {e}")
+
+        if week is not None and len(sources) == 1:
+            return week
+        # Several feeds, or an unchanged one: the week is put together from the store
+        days = self.week_days(0)
+        return self.place_events(store.events_between(days[0] << 14, (days[6] << 14) | 0x3FFF, self.source_colors(sources)), days)
+
+    def week_hash(self):
+        """CRC32 of the stored week, 0 if there is none; equal hashes mean the same week on screen."""
+        value = 0
+        buf = bytearray(256)
+        try:
+            with FILE_LOCK:
+                with open(self.CALENDAR_FILE, "rb") as file:
+                    while True:
+                        count = file.readinto(buf)
+                        if not count:
+                            return value
+                        value = binascii.crc32(memoryview(buf)[:count], value)
+        except OSError:
+            return 0
+
+    def update_calendar(self, on_event=None, on_progress=None, validators=None, stored_hash=None, wait=True):
+        """
+        Update the calendar and save it to the file system, see
+        get_week_schedule for the callbacks and load_sources for validators.
+        Returns the week hash (see week_hash) afterwards; an unchanged week,
+        compared with stored_hash or else the file, is not written again.
+
+        One sync runs at a time: a second caller waits for the first, or
+        with wait False gets None right away.
+        """
+        if not SYNC_LOCK.acquire(wait):
+            return None
+        try:
+            return self._update_calendar(on_event, on_progress, validators, stored_hash)
+        finally:
+            SYNC_LOCK.release()
+
+    def _update_calendar(self, on_event, on_progress, validators, stored_hash):
+        if stored_hash is None:
+            stored_hash = self.week_hash()
+        if self.PROXY_URL:
+            week_schedule = self.get_week_from_proxy(on_event)
+            if week_schedule is None:
+                print("Calendar unchanged.")
+                return stored_hash
+        else:
+            week_schedule = self.sync_sources(on_event, on_progress, validators)
 
         # Convert Event objects to dictionaries for JSON storage
         for day_index in range(len(week_schedule)):
-            for slot_index in range(len(week_schedule[day_index])):
-                event = week_schedule[day_index][slot_index]
-                if event is not None:
-                    week_schedule[day_index][slot_index] = event.to_dict()  # Convert to dict
+            week_schedule[day_index] = [event.to_dict() for event in week_schedule[day_index]]
 
         gc.collect()
 
+        data = json.dumps(week_schedule)
+        new_hash = binascii.crc32(data.encode())
+        if new_hash == stored_hash:
+            print("Calendar unchanged.")
+            return new_hash
         try:
-            with open("/calendar_data.json", "w") as file:  # Use .json for JSON storage
-                json.dump(week_schedule, file)  # Store calendar data in JSON format
+            with FILE_LOCK:
+                with open(self.CALENDAR_FILE, "w") as file:  # Use .json for JSON storage
+                    file.write(data)  # Store calendar data in JSON format
             print("Calendar data successfully saved to the file system.")
         except Exception as e:
             print(f"Error saving calendar data: {e}")
+            return stored_hash
+        return new_hash
 
 # Original name to ID mapping
 NAME_TO_ID = {
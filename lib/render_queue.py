@@ -0,0 +1,80 @@
+import _thread
+
+class RenderQueue:
+    """
+    Drawing commands for the display, run by a single owner.
+
+    The display pins are shared by the main loop, button callbacks and the
+    Wi-Fi thread, and a transaction interleaved with another one corrupts the
+    panel. Other threads submit work here and the main loop runs it with
+    run_pending(); code that has to draw right away uses sync() instead.
+    Both hold the same display lock.
+    """
+    def __init__(self, size=16):
+        """
+        :param size: Maximum number of pending commands, further submissions are dropped.
+        """
+        self.size = size
+        self.lock = _thread.allocate_lock()  # Held while a command talks to the display
+        self.incoming = []  # (key, function, args) submitted since the render loop last looked
+        self.pending = []   # [key, function, args] in submission order, owned by the render loop
+        self.dropped = 0
+        self.coalesced = 0
+
+    def submit(self, function, *args, key=None):
+        """
+        Queue function(*args) for the render loop.
+
+        A command with a key replaces the pending command with the same key,
+        so only the latest of several superseded updates is drawn.
+        Returns False if the queue is full and the command was dropped.
+
+        Safe from button IRQs: on the ESP32 they run on the main thread in
+        between bytecodes, possibly inside run_pending(), so submitting takes
+        no lock. It only appends to incoming (atomic under the GIL), and the
+        render loop does the coalescing.
+        """
+        if len(self.incoming) + len(self.pending) >= self.size:
+            self.dropped += 1
+            return False
+        self.incoming.append((key, function, args))
+        return True
+
+    def has_pending(self):
+        return bool(self.pending or self.incoming)
+
+    def _collect(self):
+        """Move the incoming commands to pending, replacing pending ones with the same key."""
+        # Whatever is appended while the lists are swapped lands in one of the two
+        incoming, self.incoming = self.incoming, []
+        for key, function, args in incoming:
+            if key is not None:
+                for command in self.pending:
+                    if command[0] == key:
+                        command[1] = function
+                        command[2] = args
+                        self.coalesced += 1
+                        break
+                else:
+                    self.pending.append([key, function, args])
+            else:
+                self.pending.append([key, function, args])
+
+    def run_pending(self):
+        """Run every queued command, including ones queued meanwhile. Called by the render loop only."""
+        while True:
+            if self.incoming:
+                self._collect()
+            if not self.pending:
+                return
+            _, function, args = self.pending.pop(0)
+            with self.lock:
+                try:
+                    function(*args)
+                except Exception as e:
+                    print(f"Render command failed: {e}")
+
+    def sync(self, function, *args):
+        """Run function(*args) immediately while holding the display lock and return its result."""
+        with self.lock:
+            return function(*args)
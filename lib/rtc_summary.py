@@ -0,0 +1,71 @@
+from machine import RTC # type: ignore
+import struct
+
+# RTC memory, kept through deep sleep (not a power cut), all little-endian:
+#   header      magic, state, validator count (FILE_VALIDATORS: read the file), refreshes, week hash
+#   validators  per feed: url_key, etag length, modified length, then both strings
+HEADER = "<4sBBHI"
+HEADER_SIZE = struct.calcsize(HEADER)
+ENTRY = "<IBB"
+ENTRY_SIZE = struct.calcsize(ENTRY)
+MAGIC = b"RTS1"
+FILE_VALIDATORS = 0xFF
+RTC_MEMORY = 2048  # Bytes the port keeps
+
+class RtcSummary:
+    """
+    What a deep-sleep wake needs to know without touching flash or the
+    display: the state that was on screen (its index in the application's
+    state list), the hash of the stored week (Pronote.week_hash), the feed
+    validators (Pronote.load_validators) and how many timer wakes
+    refreshed the calendar since the last full start.
+
+    Validators that do not fit in RTC memory are left to the file, they are
+    then None here.
+    """
+    def __init__(self, state=0, week_hash=0, validators=None, refreshes=0):
+        self.state = state
+        self.week_hash = week_hash
+        self.validators = validators
+        self.refreshes = refreshes
+
+    @classmethod
+    def load(cls):
+        """The summary saved before the last deep sleep, or None."""
+        data = RTC().memory()
+        if len(data) < HEADER_SIZE:
+            return None
+        magic, state, count, refreshes, week_hash = struct.unpack_from(HEADER, data)
+        if magic != MAGIC:
+            return None
+        validators = None
+        if count != FILE_VALIDATORS:
+            validators = {}
+            offset = HEADER_SIZE
+            for _ in range(count):
+                key, etag_length, modified_length = struct.unpack_from(ENTRY, data, offset)
+                offset += ENTRY_SIZE
+                etag = str(data[offset:offset + etag_length], "utf-8") if etag_length else None
+                offset += etag_length
+                modified = str(data[offset:offset + modified_length], "utf-8") if modified_length else None
+                offset += modified_length
+                validators[key] = (etag, modified)
+        return cls(state, week_hash, validators, refreshes)
+
+    def save(self):
+        """Write the summary to RTC memory."""
+        entries = []
+        size = HEADER_SIZE
+        for key, (etag, modified) in (self.validators or {}).items():
+            etag = (etag or "").encode()
+            modified = (modified or "").encode()
+            if len(etag) > 255 or len(modified) > 255:
+                entries = None  # Would not come back whole
+                break
+            entries.append(struct.pack(ENTRY, key, len(etag), len(modified)) + etag + modified)
+            size += len(entries[-1])
+        if self.validators is None or entries is None or size > RTC_MEMORY or len(entries) >= FILE_VALIDATORS:
+            entries = None
+        header = struct.pack(HEADER, MAGIC, self.state, FILE_VALIDATORS if entries is None else len(entries),
+                             min(self.refreshes, 0xFFFF), self.week_hash)
+        RTC().memory(header + b"".join(entries or ()))
@@ -0,0 +1,184 @@
+# Part kinds. A part is a hashable tuple (x, y, width, height, kind, ...) describing
+# one opaque rectangle of a widget, so two scenes can be compared part by part.
+GLYPH = 0   # (x, y, size, size, GLYPH, char, color, bg_color, font_file, scale), size = 8 * scale
+FILL = 1    # (x, y, width, height, FILL, color)
+BITMAP = 2  # (x, y, width, height, BITMAP, rows, color, bg_color)
+
+class Widget:
+    """
+    Base class for scene widgets.
+
+    A widget lists its parts in build_parts(). The scene keeps the last list
+    and only asks again while the widget is dirty, so a widget changed after
+    it was added must be marked with mark_dirty() (set_text() does it).
+    """
+    dirty = True
+    cached_parts = None
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def parts(self, scene_bg):
+        if self.dirty or self.cached_parts is None:
+            self.cached_parts = list(self.build_parts(scene_bg))
+            self.dirty = False
+        return self.cached_parts
+
+class Text(Widget):
+    """A line of 8x8 text, or scale times larger. Spaces on the scene background cost nothing to show."""
+    def __init__(self, x, y, text, color, bg_color=0x0000, font_file='fonts/vga_8x8.fnt', scale=1):
+        self.x = x
+        self.y = y
+        self.text = text
+        self.color = color
+        self.bg_color = bg_color
+        self.font_file = font_file
+        self.scale = scale
+
+    def bounds(self):
+        size = 8 * self.scale
+        return (self.x, self.y, size * len(self.text), size)
+
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.dirty = True
+
+    def build_parts(self, scene_bg):
+        size = 8 * self.scale
+        x = self.x
+        for char in self.text:
+            if char != ' ' or self.bg_color != scene_bg:
+                yield (x, self.y, size, size, GLYPH, char, self.color, self.bg_color, self.font_file, self.scale)
+            x += size
+
+class Rect(Widget):
+    """A filled rectangle."""
+    def __init__(self, x, y, width, height, color):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.color = color
+
+    def bounds(self):
+        return (self.x, self.y, self.width, self.height)
+
+    def build_parts(self, scene_bg):
+        yield (self.x, self.y, self.width, self.height, FILL, self.color)
+
+class Bitmap(Widget):
+    """A 2D list of 0s and 1s drawn in two colors."""
+    def __init__(self, x, y, image_data, color, bg_color=0x0000):
+        self.x = x
+        self.y = y
+        self.rows = tuple(tuple(row) for row in image_data)
+        self.color = color
+        self.bg_color = bg_color
+
+    def bounds(self):
+        return (self.x, self.y, len(self.rows[0]), len(self.rows))
+
+    def build_parts(self, scene_bg):
+        yield (self.x, self.y, len(self.rows[0]), len(self.rows), BITMAP, self.rows, self.color, self.bg_color)
+
+class Grid(Widget):
+    """One-pixel table lines: vertical lines at x_lines and horizontal lines at y_lines, clipped to the bounds."""
+    def __init__(self, x, y, width, height, x_lines, y_lines, color):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.x_lines = x_lines
+        self.y_lines = y_lines
+        self.color = color
+
+    def bounds(self):
+        return (self.x, self.y, self.width, self.height)
+
+    def build_parts(self, scene_bg):
+        for line_y in self.y_lines:
+            yield (self.x, line_y, self.width, 1, FILL, self.color)
+        for line_x in self.x_lines:
+            yield (line_x, self.y, 1, self.height, FILL, self.color)
+
+def overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+class Scene:
+    """
+    A retained set of widgets for one screen.
+
+    present() compares the scene with what the panel currently shows (kept
+    on the display as DisplayDriver.shown_parts, whichever scene drew it) and
+    only touches parts that differ: parts that disappeared are filled with
+    the background, new or changed parts are drawn, and parts that did not
+    change are left alone. Widgets are drawn in the order they were added.
+    """
+    def __init__(self, bg_color=0x0000):
+        self.bg_color = bg_color
+        self.widgets = []
+
+    def add(self, widget):
+        widget.dirty = True
+        self.widgets.append(widget)
+        return widget
+
+    def remove(self, widget):
+        self.widgets.remove(widget)
+
+    def parts(self):
+        parts = []
+        for widget in self.widgets:
+            parts.extend(widget.parts(self.bg_color))
+        return parts
+
+    def present(self, display):
+        """Repaint the parts of the panel that differ from this scene."""
+        if display.console is not None:
+            display.console.release()
+        old_parts = display.shown_parts
+        new_parts = self.parts()
+        new_set = set(new_parts)
+
+        to_draw = [part for part in new_parts if part not in old_parts]
+        # A part redrawn over exactly the same rectangle hides the old one, no need to erase it
+        covered = set(part[:4] for part in to_draw)
+        to_erase = [part for part in old_parts if part not in new_set and part[:4] not in covered]
+
+        for part in to_erase:
+            display.fill_rect(part[0], part[1], part[2], part[3], self.bg_color)
+
+        # Unchanged parts caught by an erased rectangle have to come back
+        redraw = set(to_draw)
+        if to_erase:
+            for part in new_parts:
+                if part not in redraw:
+                    for erased in to_erase:
+                        if overlaps(part, erased):
+                            redraw.add(part)
+                            break
+
+        self.draw_parts(display, [part for part in new_parts if part in redraw])
+        display.shown_parts = new_set
+
+    def draw_parts(self, display, parts):
+        """Draw parts in order, merging neighbouring glyphs of a row into one window."""
+        run = []
+        for part in parts:
+            if run and not (part[4] == GLYPH and part[1] == run[-1][1] and part[0] == run[-1][0] + part[2]
+                            and part[6:] == run[-1][6:]):
+                self.draw_run(display, run)
+                run = []
+            if part[4] == GLYPH:
+                run.append(part)
+            elif part[4] == FILL:
+                display.fill_rect(part[0], part[1], part[2], part[3], part[5])
+            elif part[4] == BITMAP:
+                display.draw_bitmap(part[0], part[1], part[5], part[6], part[7])
+        if run:
+            self.draw_run(display, run)
+
+    def draw_run(self, display, run):
+        first = run[0]
+        display.draw_text_block(first[0], first[1], ''.join(part[5] for part in run), first[6], first[7], first[8], first[9])
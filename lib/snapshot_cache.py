@@ -0,0 +1,101 @@
+import os
+import binascii
+from array import array
+
+class SnapshotCache:
+    """
+    Composed RGB565 blocks on flash, so static screens do not compose their
+    text pixel by pixel on every entry.
+
+    An entry is the raw pixels of one window transfer, named after a hash of
+    what was drawn (text, colors, scale, font and the CRC of its file), so
+    changed content simply gets another name and its old entry ages out. draw() streams an entry to the
+    panel with readinto() through one reusable buffer. Blocks are only
+    written to flash the second time they are drawn, so one-off text such as
+    a download percentage never reaches it, and the least recently used
+    entries are removed beyond max_files.
+    """
+    MIN_PIXELS = 256  # Smaller blocks compose faster than a file opens
+
+    def __init__(self, directory="/snap", max_files=96, buffer_pixels=256):
+        self.directory = directory
+        self.max_files = max_files
+        self.buf = array("H", bytes(2 * buffer_pixels))
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # Already there
+        self.order = os.listdir(directory)  # Least recently used first, from this boot on
+        self.stored = set(self.order)
+        self.seen = set()  # Names drawn once, stored when they come back
+        self.hits = 0
+        self.misses = 0
+
+    def name(self, *content):
+        """File name of the block drawn from content, two CRC32s of it."""
+        data = repr(content).encode()
+        return f"{binascii.crc32(data):08x}{binascii.crc32(data, 0x5A5A5A5A):08x}"
+
+    def touch(self, name):
+        self.order.remove(name)
+        self.order.append(name)
+
+    def draw(self, display, x, y, width, height, name):
+        """Stream the entry name into the window, or return False if it has to be composed."""
+        if name not in self.stored:
+            self.misses += 1
+            return False
+        view = memoryview(self.buf)
+        try:
+            with open(f"{self.directory}/{name}", "rb") as file:
+                display.cs.off()
+                display.set_window(x, y, width, height)
+                remaining = width * height
+                while remaining:
+                    count = file.readinto(view[:min(remaining, len(self.buf))]) // 2
+                    if not count:
+                        raise OSError("truncated")  # The caller draws the whole window again
+                    display.write_colors(view[:count])
+                    remaining -= count
+                display.cs.on()
+        except OSError as e:
+            display.cs.on()
+            print(f"Dropping snapshot {name}: {e}")
+            self.remove(name)
+            return False
+        self.hits += 1
+        self.touch(name)
+        return True
+
+    def store(self, name, colors):
+        """Keep the composed colors of a block drawn for the second time."""
+        if name not in self.seen:
+            if len(self.seen) >= self.max_files:
+                self.seen = set()
+            self.seen.add(name)
+            return
+        self.seen.discard(name)
+        try:
+            with open(f"{self.directory}/{name}", "wb") as file:
+                file.write(colors)
+        except OSError as e:
+            print(f"Error saving snapshot: {e}")
+            return
+        self.stored.add(name)
+        self.order.append(name)
+        while len(self.order) > self.max_files:
+            self.remove(self.order[0])
+
+    def remove(self, name):
+        try:
+            os.remove(f"{self.directory}/{name}")
+        except OSError:
+            pass
+        if name in self.stored:
+            self.stored.discard(name)
+            self.order.remove(name)
+
+    def clear(self):
+        """Remove every entry, e.g. after a font file changed."""
+        for name in list(self.order):
+            self.remove(name)
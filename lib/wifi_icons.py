@@ -1,8 +1,12 @@
 from lib.display_driver import Picture
 
 class WiFiIcons:
+    # Top right corner, drawn straight to the display over whatever screen is shown
+    X = 303
+    Y = 3
+
     def __init__(self):
-        self.connected = Picture(303, 3, 14, 14, 
+        self.connected = Picture(self.X, self.Y, 14, 14, 
             image_data=[
                 [0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0],
                 [0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0],
@@ -23,7 +27,7 @@ class WiFiIcons:
             bg_color=0x0000
         )
 
-        self.disconnected = Picture(303, 3, 14, 14,
+        self.disconnected = Picture(self.X, self.Y, 14, 14,
             image_data=[
                 [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
                 [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
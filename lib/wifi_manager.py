@@ -3,61 +3,78 @@ import _thread
 import time
 
 class WiFiManager:
-    def __init__(self, display, wifi_icons):
+    def __init__(self, display, wifi_icons, render_queue):
         self.display = display
+        self.render_queue = render_queue
         self.wifi_connected_icon = wifi_icons.connected
         self.wifi_disconnected_icon = wifi_icons.disconnected
         self.thread_active = False
         self.is_connected = False
         
         # Show disconnected icon initially
-        self.wifi_disconnected_icon.draw(self.display)
+        self.show_status(False)
+
+    def show_status(self, connected):
+        """Queue an icon update; pending updates collapse into the latest one."""
+        self.render_queue.submit(self.draw_status, connected, key="wifi_icon")
+
+    def draw_status(self, connected):
+        """Draw the icon for the given state. Must run on the render loop."""
+        if connected:
+            self.wifi_disconnected_icon.erase(self.display)
+            self.wifi_connected_icon.draw(self.display)
+        else:
+            self.wifi_connected_icon.erase(self.display)
+            self.wifi_disconnected_icon.draw(self.display)
 
     def connect(self, ssid, password):
         """Connect to WiFi using provided credentials."""
         if not ssid or not password:
             print("No WiFi credentials provided")
-            self.wifi_disconnected_icon.draw(self.display)
+            self.show_status(False)
             return False
 
         def wifi_thread():
             try:
-                wlan = network.WLAN(network.STA_IF)
-                wlan.active(True)
-
-                if not wlan.isconnected():
-                    print(f"Connecting to WiFi: {ssid}")
-                    wlan.connect(ssid, password)
-                    timeout = 10
-                    start_time = time.time()
-
-                    while not wlan.isconnected():
-                        if time.time() - start_time > timeout:
-                            print("Failed to connect to WiFi")
-                            self.is_connected = False
-                            self.wifi_disconnected_icon.draw(self.display)
-                            self.thread_active = False
-                            return
-                        time.sleep(1)
-
-                if wlan.isconnected():
-                    print("Connected to WiFi! IP:", wlan.ifconfig()[0])
-                    self.is_connected = True
-                    self.wifi_disconnected_icon.erase(self.display)
-                    self.wifi_connected_icon.draw(self.display)
+                if not connect_station(ssid, password):
+                    self.is_connected = False
+                    self.show_status(False)
+                    self.thread_active = False
+                    return
 
+                self.is_connected = True
+                self.show_status(True)
                 self.thread_active = False
                 
             except Exception as e:
                 print(f"WiFi error: {e}")
                 self.is_connected = False
-                self.wifi_disconnected_icon.draw(self.display)
+                self.show_status(False)
                 self.thread_active = False
 
         if not self.thread_active:
             self.thread_active = True
             _thread.start_new_thread(wifi_thread, ())
 
+def connect_station(ssid, password, timeout=10):
+    """Connect to WiFi and wait for it, up to timeout seconds. Returns whether it is connected."""
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+
+    if not wlan.isconnected():
+        print(f"Connecting to WiFi: {ssid}")
+        wlan.connect(ssid, password)
+        start_time = time.time()
+
+        while not wlan.isconnected():
+            if time.time() - start_time > timeout:
+                print("Failed to connect to WiFi")
+                return False
+            time.sleep_ms(100)
+
+    print("Connected to WiFi! IP:", wlan.ifconfig()[0])
+    return True
+
 def check_wifi_connection():
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
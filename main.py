@@ -1,48 +1,198 @@
 from lib.display_driver import DisplayDriver
 from lib.buttons import ButtonManager
 from lib.wifi_icons import WiFiIcons
-from lib.wifi_manager import WiFiManager
+from lib.wifi_manager import WiFiManager, connect_station
 from lib.nvs import NVSManager
-from states import MainMenuState
+from lib.render_queue import RenderQueue
+from lib.pronote import Pronote, start_feed_thread
+from lib.latency_tracer import LatencyTracer
+from lib.snapshot_cache import SnapshotCache
+from lib.power_manager import PowerManager, deep_sleep
+from lib.rtc_summary import RtcSummary
+from states import MainMenuState, SettingsState, UpdateSettingsState, PronoteState, AgendaState
+import machine # type: ignore
+import time
+
+# A state's number in the RTC summary
+STATES = (MainMenuState, SettingsState, UpdateSettingsState, PronoteState, AgendaState)
+# States shown again after a deep sleep, the others come back as the main menu
+RESUMABLE = (MainMenuState, SettingsState, PronoteState, AgendaState)
 
 class Application:
-    def __init__(self):
+    REFRESH_INTERVAL_MS = 30 * 60 * 1000  # Background calendar refresh while on Wi-Fi, and deep-sleep timer
+
+    def __init__(self, summary=None):
+        """
+        :param summary: RtcSummary saved before the deep sleep the board starts from, if any
+        """
         # Initialize display
         self.display = DisplayDriver()
-        self.display.backlight.on()
+        self.display.hold_pins(False)  # Still held after a deep sleep
         self.display.init_display()
         # self.display.fill_screen(0x0000)
         
         # Initialize NVS
         self.nvs = NVSManager()
         
+        # Text of the static screens comes back from flash instead of being composed again
+        if self.nvs.get_int("snapshots", 1):
+            self.display.snapshots = SnapshotCache()
+        
+        # Opt-in display profiling, also available from the REPL via app.display.profiler
+        if self.nvs.get_int("profile", 0):
+            self.display.profiler.enable()
+        
+        # Opt-in button to last pixel latencies, app.tracer.report() from the REPL
+        self.tracer = LatencyTracer(self.display, ButtonManager.BUTTON_PINS,
+                                    [state.__name__ for state in STATES])
+        if self.nvs.get_int("trace", 0):
+            self.tracer.enable()
+        
+        # All drawing goes through the render queue, run by the main loop
+        self.render_queue = RenderQueue()
+        
         # Initialize WiFi
         self.wifi_icons = WiFiIcons()
-        self.wifi_manager = WiFiManager(self.display, self.wifi_icons)
+        self.wifi_manager = WiFiManager(self.display, self.wifi_icons, self.render_queue)
         if self.nvs.get_string("ssid") and self.nvs.get_string("pass"):
             self.wifi_manager.connect(self.nvs.get_string("ssid"), self.nvs.get_string("pass"))
             
-        # Initialize state with display and nvs
-        self.current_state = MainMenuState(self.display, self.nvs)
+        # Initialize state with display and nvs, drawn right away under the display lock
+        state = MainMenuState
+        if summary is not None and summary.state < len(STATES) and STATES[summary.state] in RESUMABLE:
+            state = STATES[summary.state]
+        self.current_state = self.render_queue.sync(state, self.display, self.nvs)
+        
+        # Button presses are handled on the render loop, not in the IRQ callback
+        self.button_manager = ButtonManager(self.queue_button)
+        
+        # Backlight fades to dim, then off with the panel asleep; the CPU light-sleeps between events
+        self.power = PowerManager(self.display, self.button_manager,
+                                  brightness=self.nvs.get_int("bright", 100), dim=self.nvs.get_int("dim", 20),
+                                  dim_ms=self.nvs.get_int("dim_s", 30) * 1000, off_ms=self.nvs.get_int("off_s", 120) * 1000,
+                                  deep_ms=self.nvs.get_int("deep_s", 600) * 1000)
         
-        # Initialize button manager with state navigation callback
-        self.button_manager = ButtonManager(self.handle_button)
+        self.refreshing = False
+        self.last_refresh = time.ticks_ms()
         
-    def handle_button(self, button_id: str):
+    def queue_button(self, button_id: str):
+        # The edge time rides along, a later press of the same button would overwrite it
+        if not self.render_queue.submit(self.handle_button, button_id, self.button_manager.edges[button_id]):
+            print("Render queue full, dropped button:", button_id)
+        
+    def handle_button(self, button_id: str, edge_us=None):
+        if self.power.activity():
+            return  # The press only woke the screen
+        profiler = self.display.profiler
+        profiler.begin_transition(type(self.current_state).__name__)
+        self.tracer.begin(edge_us)
         new_state = self.current_state.navigate(button_id)
+        self.tracer.end(button_id, type(self.current_state).__name__)
+        profiler.end_transition(type(self.current_state).__name__, type(new_state).__name__)
         
         if new_state is not self.current_state:
             print("New State:", new_state)
             self.current_state = new_state
 
+    def start_refresh(self):
+        """
+        Download the calendar in a thread, the render loop then shows what
+        changed. Skipped while a state downloads it in the foreground.
+        """
+        self.refreshing = True
+        self.last_refresh = time.ticks_ms()
+        
+        def refresh_thread():
+            try:
+                pronote = Pronote()
+                week_hash = pronote.week_hash()
+                new_hash = pronote.update_calendar(stored_hash=week_hash, wait=False)
+                if new_hash is not None and new_hash != week_hash:
+                    self.render_queue.submit(self.calendar_updated, key="calendar")
+            except Exception as e:
+                print(f"Calendar refresh failed: {e}")
+            self.refreshing = False
+        
+        start_feed_thread(refresh_thread)
+    
+    def calendar_updated(self):
+        self.current_state.calendar_changed(Pronote().fetch_calendar())
+
+    def run(self):
+        """Render loop: the only place that draws, apart from RenderQueue.sync callers."""
+        while True:
+            self.render_queue.run_pending()
+            self.render_queue.sync(self.current_state.tick)
+            if (self.wifi_manager.is_connected and not self.refreshing
+                    and time.ticks_diff(time.ticks_ms(), self.last_refresh) >= self.REFRESH_INTERVAL_MS):
+                self.start_refresh()
+            self.render_queue.sync(self.power.update)
+            if self.power.deep_sleep_due() and not self.busy():
+                self.render_queue.sync(self.sleep)
+            self.power.idle(self.next_timer_ms(), busy=self.busy())
+
+    def sleep(self):
+        """
+        Deep-sleep until the next refresh is due, or a button is pressed,
+        after saving what the next start needs in RTC memory (see main()).
+        """
+        pronote = Pronote()
+        RtcSummary(STATES.index(type(self.current_state)), pronote.week_hash(), pronote.load_validators()).save()
+        timer = None
+        if self.nvs.get_string("ssid") and self.nvs.get_string("pass"):
+            timer = max(0, self.REFRESH_INTERVAL_MS - time.ticks_diff(time.ticks_ms(), self.last_refresh))
+        self.power.deep_sleep(timer)
+
+    def next_timer_ms(self):
+        """Milliseconds until the render loop has timed work: the state's next tick or the next refresh."""
+        timer = self.current_state.wake_in_ms()
+        if self.wifi_manager.is_connected and not self.refreshing:
+            refresh = max(0, self.REFRESH_INTERVAL_MS - time.ticks_diff(time.ticks_ms(), self.last_refresh))
+            timer = refresh if timer is None else min(timer, refresh)
+        return timer
+
+    def busy(self):
+        """Whether a thread or queued work still needs the CPU, so the loop must not light-sleep."""
+        return bool(self.refreshing or self.wifi_manager.thread_active or self.render_queue.has_pending())
+
+def quick_refresh(summary):
+    """
+    A timer woke the board from deep sleep: refresh the calendar without the
+    display or the states, save the new week hash and validators and go
+    straight back to deep sleep; the next start draws the stored week.
+    Returns, so that the application starts, only when a button is held.
+    """
+    nvs = NVSManager()
+    ssid, password = nvs.get_string("ssid"), nvs.get_string("pass")
+    if ssid and password and connect_station(ssid, password):
+        pronote = Pronote()
+        try:
+            summary.week_hash = pronote.update_calendar(validators=summary.validators, stored_hash=summary.week_hash)
+            # None when the feeds were not synced (the proxy served the week), the old ones still hold
+            if pronote.validators is not None:
+                summary.validators = pronote.validators
+        except Exception as e:
+            print(f"Calendar refresh failed: {e}")
+    if any(not machine.Pin(number, machine.Pin.IN, machine.Pin.PULL_UP).value()
+           for number in ButtonManager.BUTTON_PINS.values()):
+        return
+    summary.refreshes += 1
+    summary.save()
+    deep_sleep(Application.REFRESH_INTERVAL_MS, ButtonManager.BUTTON_PINS[PowerManager.WAKE_BUTTON])
+
 def main():
-    app = Application()
+    if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+        summary = RtcSummary.load()
+        if summary is not None:
+            if machine.wake_reason() == machine.TIMER_WAKE:
+                quick_refresh(summary)
+            return Application(summary)
+    return Application()
 
 if __name__ == "__main__":
     try:
-        main()
-        while True:
-            pass
+        app = main()
+        app.run()
     except KeyboardInterrupt as e:
         print(f"User requested exit. Goodbye! Error: {e}")
     
\ No newline at end of file
@@ -2,6 +2,7 @@ from states.base import State
 from states.main_menu import MainMenuState
 from states.settings import SettingsState
 from states.pronote import PronoteState
+from states.agenda import AgendaState
 from states.update_settings import UpdateSettingsState
 
-__all__ = ['State', 'MainMenuState', 'SettingsState', 'PronoteState', 'UpdateSettingsState'] 
\ No newline at end of file
+__all__ = ['State', 'MainMenuState', 'SettingsState', 'PronoteState', 'AgendaState', 'UpdateSettingsState'] 
\ No newline at end of file
@@ -0,0 +1,101 @@
+from lib.display_driver import DisplayDriver
+from lib.console import Console
+from lib.scene import Scene, Text, Grid
+from lib.nvs import NVSManager
+from states.base import State
+from lib.pronote import Pronote
+
+class AgendaState(State):
+    """
+    The week's lessons with their rooms, three days at a time.
+
+    UP and DOWN scroll one day back or forward. The day columns scroll in
+    hardware between the hour gutter on the left and the Wi-Fi icon column
+    on the right, which stay fixed. The scroll area is exactly three columns
+    wide and wraps around, so each day always lands in the same of three
+    column slots of display RAM: a scroll only moves the view and rewrites
+    the slot of the day that came into view, through one Console per slot
+    that sends just the cells that differ from the day it held before.
+    """
+    DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    GUTTER = 30        # Width of the fixed hour gutter
+    DAY_WIDTH = 90     # One separator column and 11 characters
+    VISIBLE_DAYS = 3   # Leaves the 20 columns right of the days to the Wi-Fi icon
+    ROW_PITCH = 11     # A slot is a subject line and a room line, 22 pixels as on the Pronote screen
+    ROOM_COLOR = 0x8410
+    EXCEPTIONAL_COLOR = 0xF800
+
+    def __init__(self, display: DisplayDriver, nvs: NVSManager):
+        self.display_driver = display
+        self.nvs = nvs
+        self.first_day = 0
+        self.pronote = Pronote()
+        self.week = self.pronote.fetch_calendar()
+
+        # The frame does not move; left in display.shown_parts, the next screen erases it
+        time_slots = ["08", "09", "10", "11", "12", "01", "02", "03", "04", "05"]
+        self.frame = Scene()
+        self.frame.add(Grid(0, 0, self.GUTTER + self.VISIBLE_DAYS * self.DAY_WIDTH, display.height,
+                            [self.GUTTER + i * self.DAY_WIDTH for i in range(self.VISIBLE_DAYS)], [20], 0xFFFF))
+        for i, time_slot in enumerate(time_slots):
+            self.frame.add(Text(3, 23 + i * 2 * self.ROW_PITCH, time_slot, 0xFFFF, 0x0000))
+        self.frame.present(display)
+
+        display.set_scroll_area(self.GUTTER, self.VISIBLE_DAYS * self.DAY_WIDTH)
+        display.scroll_to(0)
+        self.columns = []
+        for slot in range(self.VISIBLE_DAYS):
+            x = self.GUTTER + slot * self.DAY_WIDTH + 2
+            header = Console(display, x, 6, 11, 1)
+            body = Console(display, x, 23, 11, 2 * Pronote.SLOTS_PER_DAY, self.ROW_PITCH)
+            self.columns.append((header, body))
+        for day in range(self.VISIBLE_DAYS):
+            self.show_day(day)
+
+    def show_day(self, day):
+        """Write day into its column slot and send what changed."""
+        header, body = self.columns[day % self.VISIBLE_DAYS]
+        header.write_line(0, self.DAY_NAMES[day])
+        # Two lines per hour slot leave no room for side by side events, the first one shows
+        for slot, event in enumerate(self.pronote.day_slots(self.week[day])):
+            if event is None:
+                body.write_line(2 * slot, "")
+                body.write_line(2 * slot + 1, "")
+            else:
+                body.write_line(2 * slot, event.subjectName, event.subjectColor)
+                if event.exceptional:
+                    body.write_line(2 * slot + 1, event.exceptional, self.EXCEPTIONAL_COLOR)
+                else:
+                    body.write_line(2 * slot + 1, event.location, self.ROOM_COLOR)
+        header.flush()
+        body.flush()
+
+    def scroll(self, step):
+        first_day = self.first_day + step
+        if not 0 <= first_day <= len(self.DAY_NAMES) - self.VISIBLE_DAYS:
+            return
+        self.first_day = first_day
+        self.display_driver.scroll_to(first_day * self.DAY_WIDTH)
+        self.show_day(first_day if step < 0 else first_day + self.VISIBLE_DAYS - 1)
+
+    def navigate(self, button_id: str) -> State:
+        if button_id == "UP": self.scroll(-1)
+        if button_id == "DOWN": self.scroll(1)
+        if button_id == "LEFT":
+            # Put display RAM back where the other screens expect it, then clear the days
+            self.display_driver.scroll_to(0)
+            for header, body in self.columns:
+                header.release()
+                body.release()
+            from states.main_menu import MainMenuState
+            return MainMenuState(self.display_driver, self.nvs)
+        return self
+
+    def calendar_changed(self, week):
+        # The column consoles only send the cells that differ
+        self.week = week
+        self.display()
+
+    def display(self):
+        for day in range(self.first_day, self.first_day + self.VISIBLE_DAYS):
+            self.show_day(day)
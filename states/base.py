@@ -1,12 +1,31 @@
-from lib.display_driver import Label, DisplayDriver
+from lib.display_driver import DisplayDriver
 from lib.nvs import NVSManager
+from lib.console import menu_console
+from lib.list_view import ListView
 
 class State:
     """Interface for menu states"""
-    def update_display_options(self, labels, options, current_option, previous_option, display) -> None:
-        labels[previous_option].set_text(display, f"  {options[previous_option]}")
-        labels[current_option].set_text(display, f"> {options[current_option]}")
+    def build_menu(self, options, display) -> None:
+        """Show options as a list in the menu console, see update_display_options for the cursor."""
+        console = menu_console(display)
+        console.clear()
+        self.menu = ListView(console, len(options), lambda index: (options[index], 0xFFFF))
+
+    def update_display_options(self, current_option) -> None:
+        self.menu.select(current_option)
         
+    def calendar_changed(self, week) -> None:
+        """Called on the render loop when a background refresh stored a new week."""
+        pass
+
+    def tick(self) -> None:
+        """Called by the render loop between button presses, for timed redraws."""
+        pass
+
+    def wake_in_ms(self):
+        """Milliseconds until tick() has a timed redraw to do, None if it has none."""
+        return None
+
     def navigate(self, button_id: str) -> 'State':
         raise NotImplementedError
     
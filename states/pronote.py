@@ -1,95 +1,188 @@
-from lib.display_driver import Label, DisplayDriver
+from lib.display_driver import DisplayDriver
+from lib.scene import Scene, Text, Grid, Rect
 from lib.nvs import NVSManager
 from states.base import State
-from lib.pronote import Pronote
+from lib.pronote import Pronote, changed_days, event_key, empty_week, add_event
+from lib.layout import day_boxes
+from lib.wifi_icons import WiFiIcons
 import time
 
 class PronoteState(State):
+    DAYS = 5
+    DAY_X = 31       # Left edge of Monday's column, right of its grid line
+    DAY_PITCH = 58
+    DAY_WIDTH = 57
+    TOP = 25         # Where FIRST_HOUR starts; an hour is HOUR_HEIGHT pixels
+    HOUR_HEIGHT = 22
+    ROOM_COLOR = 0x8410
+    EXCEPTIONAL_COLOR = 0xF800
+    HIGHLIGHT_COLOR = 0x0010  # Background of events changed by a refresh
+    HIGHLIGHT_MS = 2000
+
     def __init__(self, display: DisplayDriver, nvs: NVSManager):
         self.display_driver = display
         self.nvs = nvs
-        self.labels = []
+        self.scene = Scene()
         self.pronote = Pronote()
+        self.highlighted = []  # Days shown with highlighted events
+        self.highlight_start = 0
+        self.week_offset = 0  # Weeks away from the current one, browsed with UP and DOWN
         self.fetch_and_display_schedule()
 
     def navigate(self, button_id: str) -> State:
-        if button_id == "LEFT": 
-            # Clear horizontal line for day headers
-            x_start = 0
-            x_end = 320
-            y_position = 20
-            self.display_driver.draw_line(x_start, y_position, x_end, y_position, 0x0000, 1)
-            
-            # Clear vertical lines for time slots
-            x_position = 30
-            x_spacing = 58
-            y_start = 0
-            y_end = 240
-            for i in range(5):
-                self.display_driver.draw_line(x_position + i * x_spacing, y_start, x_position + i * x_spacing, y_end, 0x0000, 1)
-
-            [label.erase(self.display_driver) for label in self.labels]
+        if button_id == "UP": self.browse(self.week_offset - 1)
+        if button_id == "DOWN": self.browse(self.week_offset + 1)
+        if button_id == "LEFT":
+            # The next state's scene erases the grid and labels that it does not share
             from states.main_menu import MainMenuState
             return MainMenuState(self.display_driver, self.nvs)
         return self
-    
+
     def fetch_and_display_schedule(self):
-        events = self.pronote.fetch_calendar()
-        
+        # Draw the grid right away; without a stored week the days fill in while it downloads
+        stored = self.pronote.load_calendar()
+        self.week = stored if stored is not None else empty_week()
+
         # Display the fetched schedule on the screen
         day_labels = ["Mon", "Tue", "Wed", "Thu", "Fri"]
         time_slots = ["08", "09", "10", "11", "12", "01", "02", "03", "04", "05"]
 
-        # Draw horizontal line for day headers
-        x_start = 0
-        x_end = 320
-        y_position = 20
-        self.display_driver.draw_line(x_start, y_position, x_end, y_position, 0xFFFF, 1)
-
-        # Draw vertical lines for time slots
+        # Horizontal line under the day headers, vertical lines between the days
         x_position = 30
         x_spacing = 58
-        y_start = 0
-        y_end = 240
-        for i in range(5):
-            self.display_driver.draw_line(x_position + i * x_spacing, y_start, x_position + i * x_spacing, y_end, 0xFFFF, 1)
+        self.scene.add(Grid(0, 0, self.display_driver.width, self.display_driver.height,
+                            [x_position + i * x_spacing for i in range(5)], [20], 0xFFFF))
+
+        # Which week is shown, relative to this one, in the corner above the hours
+        self.week_label = self.scene.add(Text(3, 6, "", 0xFFFF, 0x0000))
 
-        # Draw day headers
+        # Draw day headers at twice the font size over their columns. The Wi-Fi icon is
+        # drawn outside the scene, so a header that would reach it (Friday's) stays at 1x
         x_start = 35
         x_spacing = 58
-        y_position = 6
+        y_position = 2
         for i, day in enumerate(day_labels):
-            label = Label(x_start + i * x_spacing, y_position, day, 0xFFFF, 0x0000)
-            self.labels.append(label)
-            label.draw(self.display_driver)
-        
-            
+            x = x_start + i * x_spacing
+            if x + 16 * len(day) <= WiFiIcons.X:
+                self.scene.add(Text(x, y_position, day, 0xFFFF, 0x0000, scale=2))
+            else:
+                self.scene.add(Text(x, y_position + 4, day, 0xFFFF, 0x0000))
+
         # Draw time slots
         x_position = 3
         y_position = 28
         y_spacing = 22
         for i, time_slot in enumerate(time_slots):
-            label = Label(x_position, y_position + i * y_spacing, time_slot, 0xFFFF, 0x0000)
-            self.labels.append(label)
-            label.draw(self.display_driver)
-            
-        # Draw time slots and events
-        x_start = 35
-        y_start = 27
-        y_spacing = 22
-        x_spacing = 58
-        for time_index, time_slot in enumerate(time_slots):
-            y_position = y_start + time_index * y_spacing
-            for day_index in range(len(day_labels)):
-                event = events[day_index][time_index]
-                if event is None:
-                    continue
-                max_chars = 6
-                subject_name = event.subjectName[:max_chars]
-                subject_color = event.subjectColor
-                label = Label(x_start + day_index * x_spacing, y_position, subject_name, subject_color, 0x0000)
-                self.labels.append(label)
-                label.draw(self.display_driver)
-        
+            self.scene.add(Text(x_position, y_position + i * y_spacing, time_slot, 0xFFFF, 0x0000))
+
+        # The widgets of each day's events, laid out by show_day
+        self.boxes = [[] for _ in range(self.DAYS)]
+        for day_index in range(self.DAYS):
+            self.show_day(day_index)
+
+        self.scene.present(self.display_driver)
+        if stored is None:
+            self.download_schedule()
+
+    def download_schedule(self):
+        # Download progress in the empty corner above the hours
+        self.progress = self.scene.add(Text(3, 6, " 0%", 0xFFFF, 0x0000))
+        self.scene.present(self.display_driver)
+        try:
+            self.pronote.update_calendar(self.event_arrived, self.show_progress)
+        except Exception as e:
+            print(f"Failed to download the calendar: {e}")
+        self.scene.remove(self.progress)
+        stored = self.pronote.load_calendar()
+        if stored is not None:
+            self.calendar_changed(stored)  # Shares the stored Event objects, the days normally stay as they are
+        else:
+            self.scene.present(self.display_driver)
+
+    def event_arrived(self, day, event):
+        if day < self.DAYS:
+            add_event(self.week[day], event)
+            self.show_day(day)
+            self.scene.present(self.display_driver)
+
+    def show_progress(self, done, total):
+        text = f"{min(99, done * 100 // total):2}%"
+        if text != self.progress.text:
+            self.progress.set_text(text)
+            self.scene.present(self.display_driver)
+
+    def show_day(self, day, highlight=()):
+        """
+        Lay out the day's events from self.week; the next present() draws what
+        changed. Each event gets a bar in its subject color over its exact
+        time, and its subject and room when there is room for them. Events
+        whose event_key is in highlight get a highlighted background.
+        """
+        for widget in self.boxes[day]:
+            self.scene.remove(widget)
+        widgets = self.boxes[day] = []
+        height = self.display_driver.height - self.TOP
+        first_minute = Pronote.FIRST_HOUR * 60
+        last_minute = first_minute + height * 60 // self.HOUR_HEIGHT
+        boxes = day_boxes(self.week[day], day, self.DAY_X + day * self.DAY_PITCH, self.TOP, self.DAY_WIDTH, height,
+                          first_minute, last_minute)
+        for x, y, width, box_height, event in boxes:
+            widgets.append(self.scene.add(Rect(x, y, 2, box_height - 1, event.subjectColor)))
+            chars = (width - 4) // 8
+            if box_height < 10 or not chars:
+                continue
+            bg_color = self.HIGHLIGHT_COLOR if event_key(event) in highlight else 0x0000
+            padding = " " * chars  # Spaces only cost something on a highlighted background
+            widgets.append(self.scene.add(Text(x + 4, y + 2, (event.subjectName + padding)[:chars], event.subjectColor, bg_color)))
+            if box_height >= 20:
+                if event.exceptional:
+                    room, color = event.exceptional, self.EXCEPTIONAL_COLOR
+                else:
+                    room, color = event.location, self.ROOM_COLOR
+                widgets.append(self.scene.add(Text(x + 4, y + 12, (room + padding)[:chars], color, bg_color)))
+
+    def browse(self, offset):
+        """Show another week; only the current one is downloaded, the others come from the event store."""
+        self.clear_highlight()
+        self.week_offset = offset
+        if offset == 0:
+            week = self.pronote.load_calendar() or empty_week()
+        else:
+            week = self.pronote.load_week(offset)
+        changed = list(changed_days(self.week, week, self.DAYS))
+        self.week = week
+        for day, keys in changed:
+            self.show_day(day)
+        self.week_label.set_text(f"{offset:+d}" if offset else "")
+        self.scene.present(self.display_driver)
+
+    def calendar_changed(self, week):
+        """Repaint only the days that differ from the new week, their new events highlighted for a moment."""
+        if self.week_offset:
+            return  # Another week is shown, the refreshed one is loaded when browsing back
+        self.clear_highlight()
+        changed = list(changed_days(self.week, week, self.DAYS))
+        self.week = week
+        for day, keys in changed:
+            self.show_day(day, keys)
+        self.highlighted = [day for day, keys in changed if keys]
+        self.highlight_start = time.ticks_ms()
+        self.scene.present(self.display_driver)
+
+    def clear_highlight(self):
+        for day in self.highlighted:
+            self.show_day(day)
+        self.highlighted = []
+
+    def tick(self):
+        if self.highlighted and time.ticks_diff(time.ticks_ms(), self.highlight_start) >= self.HIGHLIGHT_MS:
+            self.clear_highlight()
+            self.scene.present(self.display_driver)
+
+    def wake_in_ms(self):
+        if self.highlighted:
+            return max(0, self.HIGHLIGHT_MS - time.ticks_diff(time.ticks_ms(), self.highlight_start))
+        return None
+
     def display(self):
-        self.update_display_options(self.labels, self.options, self.current_option, self.previous_option, self.display_driver) 
\ No newline at end of file
+        self.scene.present(self.display_driver)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import network  # type: ignore
 import socket
 import _thread
-from lib.display_driver import Label, DisplayDriver
+from lib.display_driver import DisplayDriver
 from lib.nvs import NVSManager
 from states.base import State
 from lib.settings_template import get_settings_html, get_updated_html  # Import the HTML template function
@@ -46,11 +46,9 @@ class UpdateSettingsState(State):
         self.options = ["Access Point Started",
                         f"AP SSID: {self.AP_SSID}", 
                         f"IP: {self.ip}"]
-        self.labels = [Label(10, 10 + i * 20, f"  {option}", 0xFFFF, 0x0000) for i, option in enumerate(self.options)]
+        self.build_menu(self.options, self.display_driver)
         self.current_option = 0
-        self.previous_option = 0
-        [label.draw(self.display_driver) for label in self.labels]
-        self.update_display_options(self.labels, self.options, self.current_option, self.previous_option, self.display_driver)
+        self.update_display_options(self.current_option)
 
     def start_server(self):
         """Start the web server in a separate thread."""
@@ -141,13 +139,11 @@ class UpdateSettingsState(State):
         if (button_id == "LEFT"):
             self.ap.active(False)
             self.stop_server()
-            [label.erase(self.display_driver) for label in self.labels]
             from states.settings import SettingsState
             return SettingsState(self.display_driver, self.nvs)  # Return to SettingsState
         
         self.display()
-        self.previous_option = self.current_option
         return self
     
     def display(self):
-        self.update_display_options(self.labels, self.options, self.current_option, self.previous_option, self.display_driver)
\ No newline at end of file
+        self.update_display_options(self.current_option)
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Benchmark Pronote.get_week_schedule on synthetic feeds.
+
+    python tools/bench_pronote.py                       # 1k and 10k events, compared to the baseline
+    python tools/bench_pronote.py --events 1000,100000
+    python tools/bench_pronote.py --save                # record the current numbers as the baseline
+    python tools/bench_pronote.py --gzip                # feeds served gzip-compressed
+
+Feeds come from tools/ics_feed.py and are served over a local HTTP server so
+the whole fetch-and-parse path runs, with the byte window widened to the full
+feed. For every size it reports how many bytes were downloaded, parse
+throughput (events/s, bytes/s), how long the first event of the week takes to
+come out (what the Pronote screen waits for before it can draw a cell), peak
+heap and how many allocations the parse leaves behind, and compares them with
+tools/baselines/pronote_parse.json, where --gzip runs have their own entries.
+A regression beyond the tolerances below makes the script exit with status 1.
+It also builds the event store from all the feed's events and times reading
+one week back from it.
+
+On CPython the heap is measured with tracemalloc, and allocations are the
+memory blocks allocated by lib/ that are still alive once the parsed week is
+returned. Under the
+MicroPython unix port, pass a feed written by tools/ics_feed.py with --file;
+the garbage collector is then disabled during the parse, so gc.mem_alloc()
+reports every byte the parse allocated and that figure stands in for both.
+"""
+import gc
+import json
+import os
+import sys
+import time
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+if MICROPYTHON:
+    ROOT = "."
+else:
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, ROOT)
+
+BASELINE_FILE = ROOT + "/tools/baselines/pronote_parse.json"
+DEFAULT_EVENTS = [1000, 10000]
+BENCH_DAY = (2024, 9, 4, 12, 0, 0, 2, 248)  # A Wednesday early in the generated year
+
+# How far a number may move in the wrong direction before it counts as a regression
+TOLERANCES = {
+    "events_per_s": 0.25,
+    "bytes_per_s": 0.25,
+    "peak_heap": 0.10,
+    "allocations": 0.10,
+}
+LOWER_IS_WORSE = ("events_per_s", "bytes_per_s")
+
+
+def _file_get(url, headers=None, accept_gzip=False):
+    """http_client.get over a local file, for the MicroPython unix port; the file is never compressed."""
+    from lib import http_client
+    file = open(url, "rb")
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(0)
+    return http_client.Response(file, 200, {"content-length": str(size)}, http_client.LengthBody(file, size))
+
+
+class _Stubs:
+    """Bare attribute bags standing in for the hardware modules on the unix port."""
+    Pin = SPI = None
+    STA_IF = AP_IF = 0
+
+    @staticmethod
+    def settime():
+        pass
+
+
+def install_modules():
+    if MICROPYTHON:
+        for name in ("machine", "network", "ntptime"):
+            sys.modules[name] = _Stubs
+        from lib import http_client
+        http_client.get = _file_get
+    else:
+        from tools import emulator
+        emulator.install()
+        os.environ["TZ"] = "UTC"
+        time.tzset()
+
+
+def parse(url, size, on_event=None, on_parsed=None):
+    from lib.pronote import Pronote
+    pronote = Pronote()
+    pronote.FEED_START = 0
+    pronote.FEED_END = size + 1
+    return pronote.get_week_schedule(url, BENCH_DAY, on_event, None, on_parsed)
+
+
+def now():
+    return time.ticks_us() / 1000000 if MICROPYTHON else time.perf_counter()
+
+
+def measure(url, size, events, repeat=3):
+    """Time the best of repeat parses, then run one more under the heap probe."""
+    elapsed = first_event = None
+    for _ in range(repeat):
+        gc.collect()
+        arrivals = []
+        start = now()
+        week = parse(url, size, lambda day, event: arrivals.append(now()) if not arrivals else None)
+        seconds = now() - start
+        elapsed = seconds if elapsed is None else min(elapsed, seconds)
+        if arrivals:
+            seconds = arrivals[0] - start
+            first_event = seconds if first_event is None else min(first_event, seconds)
+    placed = len({id(event) for day in week for event in day if event is not None})
+
+    gc.collect()
+    if MICROPYTHON:
+        before = gc.mem_alloc()
+        gc.disable()
+        try:
+            parse(url, size)
+            peak = allocations = gc.mem_alloc() - before
+        finally:
+            gc.enable()
+    else:
+        import tracemalloc
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        week = parse(url, size)
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        # Only count what the firmware holds on to, not the HTTP server thread
+        firmware = [tracemalloc.Filter(True, os.path.join(ROOT, "lib", "*"))]
+        after = after.filter_traces(firmware)
+        before = before.filter_traces(firmware)
+        allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        del week
+
+    store = measure_store(url, size)
+    return {
+        "store_bytes": store[0],
+        "store_build_s": store[1],
+        "store_week_ms": store[2],
+        "events": events,
+        "bytes": size,
+        "placed": placed,
+        "seconds": round(elapsed, 4),
+        "first_event_s": None if first_event is None else round(first_event, 4),
+        "events_per_s": round(events / elapsed),
+        "bytes_per_s": round(size / elapsed),
+        "peak_heap": peak,
+        "allocations": allocations,
+    }
+
+
+def measure_store(url, size, repeat=20):
+    """Build an event store from the whole feed; its size, build time and the time to read one week back."""
+    from lib.event_store import EventStore
+    from lib.pronote import pack_time
+    path = "bench_events.bin"
+    parsed = []
+    parse(url, size, on_parsed=parsed.append)
+    try:
+        start = now()
+        EventStore(path).update(parsed)
+        build = now() - start
+        store = EventStore(path)
+        # The bench week, Monday 00:00 to Sunday 23:59
+        monday = pack_time(BENCH_DAY[0], BENCH_DAY[7] - BENCH_DAY[6], 0, 0, 0)
+        sunday = pack_time(BENCH_DAY[0], BENCH_DAY[7] - BENCH_DAY[6] + 6, 6, 23, 59)
+        start = now()
+        for _ in range(repeat):
+            store.events_between(monday, sunday)
+        query = (now() - start) / repeat
+        return os.stat(path)[6], round(build, 4), round(query * 1000, 3)
+    finally:
+        for leftover in (path, path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass  # Not written, or the failed update already removed it
+
+
+def compare(result, baseline):
+    """Return the names of the numbers that regressed against baseline."""
+    regressions = []
+    for key, tolerance in TOLERANCES.items():
+        if key not in baseline or not baseline[key]:
+            continue
+        change = (result[key] - baseline[key]) / baseline[key]
+        if key in LOWER_IS_WORSE:
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{key} {baseline[key]} -> {result[key]}")
+    return regressions
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE) as file:
+            return json.load(file)
+    except OSError:
+        return {}
+
+
+def save_baselines(baselines):
+    if not MICROPYTHON:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+    with open(BASELINE_FILE, "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def run(sizes, feed_file=None, compress=False):
+    results = {}
+    if feed_file is not None:
+        size = os.stat(feed_file)[6]
+        with open(feed_file, "rb") as file:
+            events = sum(1 for line in file if line.startswith(b"BEGIN:VEVENT"))
+        results[str(events)] = measure(feed_file, size, events)
+        results[str(events)]["download"] = size
+        return results
+
+    from tools.ics_feed import FeedServer, generate
+    feeds = {f"feed-{events}": generate(events) for events in sizes}
+    with FeedServer(feeds, gzip=compress) as server:
+        for events in sizes:
+            name = f"feed-{events}"
+            results[str(events)] = measure(server.url(name), len(feeds[name]), events)
+            results[str(events)]["download"] = server.sent[name]
+    return results
+
+
+def main(argv):
+    sizes = DEFAULT_EVENTS
+    feed_file = None
+    save = "--save" in argv
+    if "--events" in argv:
+        sizes = [int(value) for value in argv[argv.index("--events") + 1].split(",")]
+    if "--file" in argv:
+        feed_file = argv[argv.index("--file") + 1]
+    compress = "--gzip" in argv
+
+    install_modules()
+    results = run(sizes, feed_file, compress)
+
+    baselines = load_baselines()
+    implementation = sys.implementation.name + ("-gzip" if compress else "")
+    recorded = baselines.get(implementation, {})
+    failed = False
+    print(f"{'events':>8} {'bytes':>10} {'download':>10} {'seconds':>9} {'1st event':>10} {'events/s':>10} {'bytes/s':>11} {'peak heap':>11} {'allocs':>8}")
+    for key, result in results.items():
+        print(f"{result['events']:>8} {result['bytes']:>10} {result['download']:>10} {result['seconds']:>9} {str(result['first_event_s']):>10} "
+              f"{result['events_per_s']:>10} {result['bytes_per_s']:>11} {result['peak_heap']:>11} {result['allocations']:>8}")
+        print(f"{'':>8} event store: {result['store_bytes']} bytes, built in {result['store_build_s']} s, "
+              f"one week read back in {result['store_week_ms']} ms")
+        if not save and key in recorded:
+            for regression in compare(result, recorded[key]):
+                print("  regression:", regression)
+                failed = True
+
+    if save:
+        recorded.update(results)
+        baselines[implementation] = recorded
+        save_baselines(baselines)
+        print("Baseline saved to", BASELINE_FILE)
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,202 @@
+"""
+Measure what each screen costs on the display bus and hold it to a budget.
+
+    python tools/bench_render.py                     # check against tools/budgets/render.json
+    python tools/bench_render.py --update            # rewrite the budgets with the current numbers
+    python tools/bench_render.py --history FILE      # also append the results to a JSON lines file
+
+Every operation runs on the emulated panel from tools/emulator.py, which
+records pin writes, pin toggles, bus writes (WR cycles), CS transactions and
+pixels. Those counts are deterministic, so the budgets are exact: any
+operation that needs more of them than its budget fails the run. Host time
+is reported for reference only.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.render_screens import BUS, dense_week, new_display, new_nvs, overlap_week, use_week
+from states import AgendaState, MainMenuState, PronoteState, SettingsState
+
+BUDGET_FILE = os.path.join(ROOT, "tools", "budgets", "render.json")
+BUDGETED = ("pin_writes", "pin_toggles", "wr_cycles", "cs_transactions", "pixels")
+
+
+def screen(state_class, week=None):
+    """Set up a blank panel; the measured action draws state_class on it."""
+    def setup():
+        if week is not None:
+            use_week(week())
+        display = new_display()
+        nvs = new_nvs()
+        return lambda: state_class(display, nvs)
+    return setup
+
+
+def menu_cursor():
+    """Move the main menu cursor down once."""
+    state = MainMenuState(new_display(), new_nvs())
+    return lambda: state.navigate("DOWN")
+
+
+def menu_to_settings():
+    """Open Settings from the main menu; both screens share the menu layout."""
+    state = MainMenuState(new_display(), new_nvs())
+    state.navigate("UP")  # The cursor wraps around to the last entry
+    return lambda: state.navigate("RIGHT")
+
+
+def long_list_scroll():
+    """Move the cursor of a 1000 item menu list past the last visible row."""
+    from lib.console import menu_console
+    from lib.list_view import ListView
+    menu = ListView(menu_console(new_display()), 1000, lambda index: (f"Network {index:04}", 0xFFFF))
+    menu.select(menu.height - 1)
+    return lambda: menu.select(menu.height)
+
+
+def agenda_scroll():
+    """Scroll the agenda of the dense week forward by one day."""
+    use_week(dense_week())
+    state = AgendaState(new_display(), new_nvs())
+    return lambda: state.navigate("DOWN")
+
+
+def calendar_room_change():
+    """Refresh the Pronote screen with a week where one lesson moved to another room."""
+    use_week(dense_week())
+    state = PronoteState(new_display(), new_nvs())
+    week = dense_week()
+    week[2][2] = dict(week[2][2], location="B07")  # Wednesday's third lesson, from 12:00
+    use_week(week)
+    new_week = state.pronote.fetch_calendar()
+    return lambda: state.calendar_changed(new_week)
+
+
+def pronote_next_week():
+    """Browse from the dense week to next week's, read from the event store, where one lesson moved room."""
+    from lib.event_store import EventStore
+    from lib.pronote import Event, Pronote, SUBJECT_MAPPINGS, pack_time
+    from tools.render_screens import DENSE_WEEK
+    use_week(dense_week())
+    state = PronoteState(new_display(), new_nvs())
+    now = time.localtime()
+    events = []
+    for day, first, count, subject_id, room in DENSE_WEEK:
+        date = time.localtime(time.mktime((now[0], now[1], now[2] - now[6] + 7 + day, 12, 0, 0, 0, 0, -1)))
+        event = Event()
+        event.start = pack_time(date[0], date[7], date[6], Pronote.FIRST_HOUR + first, 0)
+        event.end = pack_time(date[0], date[7], date[6], Pronote.FIRST_HOUR + first + count, 0)
+        event.subjectID = subject_id
+        event.teacher = "M. Martin"
+        event.location = "B07" if (day, first) == (2, 4) else room
+        events.append(event)
+    EventStore(Pronote.STORE_FILE).update(events)
+    return lambda: state.navigate("DOWN")
+
+
+def wifi_icon_toggle():
+    """Swap the disconnected Wi-Fi icon for the connected one."""
+    from lib.render_queue import RenderQueue
+    from lib.wifi_icons import WiFiIcons
+    from lib.wifi_manager import WiFiManager
+    display = new_display()
+    queue = RenderQueue()
+    manager = WiFiManager(display, WiFiIcons(), queue)
+    queue.run_pending()
+
+    def toggle():
+        manager.show_status(True)
+        queue.run_pending()
+    return toggle
+
+
+# name -> setup returning the measured action
+OPERATIONS = {
+    "main_menu": screen(MainMenuState),
+    "settings": screen(SettingsState),
+    "pronote_dense_week": screen(PronoteState, dense_week),
+    "pronote_overlap_week": screen(PronoteState, overlap_week),
+    "agenda_dense_week": screen(AgendaState, dense_week),
+    "menu_cursor": menu_cursor,
+    "menu_to_settings": menu_to_settings,
+    "long_list_scroll": long_list_scroll,
+    "agenda_scroll": agenda_scroll,
+    "calendar_room_change": calendar_room_change,
+    "pronote_next_week": pronote_next_week,
+    "wifi_icon_toggle": wifi_icon_toggle,
+}
+
+
+def run():
+    results = {}
+    for name, setup in OPERATIONS.items():
+        action = setup()
+        BUS.reset_counters()
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        result = BUS.counters()
+        result["host_ms"] = round(elapsed * 1000, 1)
+        results[name] = result
+    return results
+
+
+def load_budgets():
+    try:
+        with open(BUDGET_FILE) as file:
+            return json.load(file)
+    except OSError:
+        return {}
+
+
+def append_history(path, results):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    with open(path, "a") as file:
+        file.write(json.dumps({"time": int(time.time()), "commit": commit, "results": results}) + "\n")
+
+
+def main(argv):
+    results = run()
+    budgets = load_budgets()
+
+    failed = False
+    print(f"{'operation':<20}" + "".join(f"{key:>16}" for key in BUDGETED + ("host_ms",)))
+    for name, result in results.items():
+        print(f"{name:<20}" + "".join(f"{result[key]:>16}" for key in BUDGETED + ("host_ms",)))
+        budget = budgets.get(name)
+        if budget is None:
+            print("  no budget recorded")
+            continue
+        for key in BUDGETED:
+            if result[key] > budget[key]:
+                print(f"  over budget: {key} {result[key]} > {budget[key]}")
+                failed = True
+            elif result[key] < budget[key]:
+                print(f"  under budget: {key} {result[key]} < {budget[key]}, run with --update to tighten")
+
+    if "--history" in argv:
+        append_history(argv[argv.index("--history") + 1], results)
+
+    if "--update" in argv:
+        os.makedirs(os.path.dirname(BUDGET_FILE), exist_ok=True)
+        with open(BUDGET_FILE, "w") as file:
+            json.dump({name: {key: result[key] for key in BUDGETED} for name, result in results.items()},
+                      file, indent=2)
+            file.write("\n")
+        print("Budgets written to", BUDGET_FILE)
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,172 @@
+"""
+Build a font container (lib/font.py) from a raw bitmap font.
+
+    python tools/build_font.py                                  # fonts/vga_8x8.bin -> fonts/vga_8x8.fnt
+    python tools/build_font.py --rle fonts/vga_8x8.bin out.fnt  # PackBits-compressed glyphs
+    python tools/build_font.py --size 8x16 big.bin big.fnt      # lib.font.Font reads it, DisplayDriver only draws 8x8
+
+A raw font holds one glyph per byte value, in the order of --encoding
+(cp437 for the VGA font). Every glyph is filed under its Unicode code
+point, so French text no longer shows the box-drawing characters that
+happen to share its Latin-1 values. On top of the raw font, the builder
+adds the accented capitals and the œ ligature that CP437 lacks, and maps
+typographic quotes and dashes to their plain forms. Identical glyphs are
+stored once.
+"""
+import argparse
+import os
+import struct
+import sys
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.font import HEADER, MAGIC, RLE
+
+# Characters drawn as another one
+ALIASES = {"’": "'", "‘": "'", "‚": ",", "“": '"', "”": '"', "„": '"', "–": "-", "—": "-", "…": "."}
+
+# Glyphs CP437 has no counterpart for, as 8x8 bitmaps
+EXTRA_8x8 = {
+    "œ": ["........",
+          "........",
+          ".##.##..",
+          "#..#..#.",
+          "#..####.",
+          "#..#....",
+          ".##.###.",
+          "........"],
+    "Œ": [".#######",
+          "#..#....",
+          "#..#....",
+          "#..####.",
+          "#..#....",
+          "#..#....",
+          ".#######",
+          "........"],
+    "€": ["..####..",
+          ".#....#.",
+          "#####...",
+          ".#......",
+          "#####...",
+          ".#....#.",
+          "..####..",
+          "........"],
+}
+
+# Capitals whose accent is taken from the lowercase letter, e.g. À from à and A
+ACCENTED_CAPITALS = "ÀÂÈÊËÎÏÔÙÛŸ"
+
+
+def squash(rows, keep):
+    """The rows of a glyph cut down to keep rows, dropping those that repeat their neighbour first."""
+    rows = list(rows)
+    while len(rows) > keep:
+        for i in range(1, len(rows)):
+            if rows[i] == rows[i - 1]:
+                del rows[i]
+                break
+        else:
+            del rows[len(rows) // 2]
+    return rows
+
+
+def accented_capital(char, glyphs, height):
+    """An 8-row capital with an accent: the accent rows of the lowercase letter over the squashed capital."""
+    lower = char.lower()
+    base = unicodedata.normalize("NFD", char)[0]
+    if lower not in glyphs or base not in glyphs:
+        return None
+    accent = glyphs[lower][:2]
+    body = squash(glyphs[base][:height - 1], height - 3)
+    return bytes(accent) + bytes(body) + bytes(glyphs[base][height - 1:])
+
+
+def pack_bits(data):
+    """PackBits-compress data, see lib.font.unpack_bits."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        run = 1
+        while i + run < len(data) and run < 128 and data[i + run] == data[i]:
+            run += 1
+        if run > 1:
+            out += bytes((257 - run, data[i]))
+            i += run
+            continue
+        literal = i
+        while i < len(data) and i - literal < 128 and (i + 1 >= len(data) or data[i + 1] != data[i]):
+            i += 1
+        out += bytes((i - literal - 1,)) + data[literal:i]
+    return bytes(out)
+
+
+def build(raw, width, height, encoding, rle=False, missing="?"):
+    """The container bytes for raw, a font of 256 glyphs in encoding order."""
+    size = height * ((width + 7) // 8)
+    glyphs = {}
+    for value in range(len(raw) // size):
+        char = bytes((value,)).decode(encoding)
+        glyphs.setdefault(char, raw[value * size:(value + 1) * size])
+    if (width, height) == (8, 8):
+        for char, rows in EXTRA_8x8.items():
+            glyphs.setdefault(char, bytes(int(row.replace(".", "0").replace("#", "1"), 2) for row in rows))
+        for char in ACCENTED_CAPITALS:
+            glyph = accented_capital(char, glyphs, height)
+            if glyph is not None:
+                glyphs.setdefault(char, glyph)
+    for char, target in ALIASES.items():
+        if char not in glyphs and target in glyphs:
+            glyphs[char] = glyphs[target]
+
+    # One copy of each bitmap, numbered in code point order so that ranges stay long
+    numbers = {}
+    order = []
+    mapping = []
+    for code in sorted(ord(char) for char in glyphs if ord(char) <= 0xFFFF):
+        bitmap = glyphs[chr(code)]
+        if bitmap not in numbers:
+            numbers[bitmap] = len(order)
+            order.append(bitmap)
+        mapping.append((code, numbers[bitmap]))
+
+    ranges = []
+    for code, number in mapping:
+        if ranges and ranges[-1][0] + ranges[-1][1] == code and ranges[-1][2] + ranges[-1][1] == number:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([code, 1, number])
+
+    if rle:
+        packed = [pack_bits(bitmap) for bitmap in order]
+        offsets = [0]
+        for data in packed:
+            offsets.append(offsets[-1] + len(data))
+        body = struct.pack(f"<{len(offsets)}H", *offsets) + b"".join(packed)
+    else:
+        body = b"".join(order)
+    header = struct.pack(HEADER, MAGIC, width, height, RLE if rle else 0, len(ranges), len(order), numbers[glyphs[missing]])
+    return header + b"".join(struct.pack("<HHH", *entry) for entry in ranges) + body, len(ranges), len(order)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", default=os.path.join(ROOT, "fonts", "vga_8x8.bin"))
+    parser.add_argument("output", nargs="?", default=os.path.join(ROOT, "fonts", "vga_8x8.fnt"))
+    parser.add_argument("--size", default="8x8", help="glyph width x height (default: 8x8)")
+    parser.add_argument("--encoding", default="cp437", help="order of the glyphs in the raw font (default: cp437)")
+    parser.add_argument("--rle", action="store_true", help="PackBits-compress every glyph")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    with open(args.source, "rb") as file:
+        raw = file.read()
+    data, range_count, glyph_count = build(raw, width, height, args.encoding, args.rle)
+    with open(args.output, "wb") as file:
+        file.write(data)
+    print(f"{args.output}: {glyph_count} glyphs in {range_count} ranges, {len(data)} bytes")
+
+
+if __name__ == "__main__":
+    main()
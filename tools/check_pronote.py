@@ -0,0 +1,72 @@
+"""
+Regression checks for the calendar code, on the host.
+
+    python tools/check_pronote.py
+
+Each check prints one line and the script exits with 1 if any failed.
+"""
+import datetime
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.ics_feed import FeedServer, generate  # Installs the emulator
+
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+from lib.pronote import Pronote, time_year
+
+CHECKS = []
+
+
+def check(function):
+    CHECKS.append(function)
+    return function
+
+
+def local_day(year, month, day):
+    """A time.localtime() tuple of noon on that day, as the board passes it."""
+    return time.localtime(time.mktime((year, month, day, 12, 0, 0, 0, 0, -1)))
+
+
+@check
+def week_across_new_year(server):
+    """A week from Monday 2025-12-29 has all five school days, asked for on either side of New Year."""
+    failures = []
+    for year, month, day in ((2025, 12, 31), (2026, 1, 2)):
+        pronote = Pronote()
+        pronote.FEED_START = 0
+        pronote.FEED_END = 1 << 30
+        week = pronote.get_week_schedule(server.url("new-year"), local_day(year, month, day))
+        counts = [len(events) for events in week]
+        if not all(counts[:5]) or any(counts[5:]):
+            failures.append(f"{year}-{month:02}-{day:02}: events per day {counts}")
+    return failures
+
+
+@check
+def time_shifted_across_new_year():
+    """An iCal time that the time zone shift moves back into December keeps December's year."""
+    packed = Pronote().convert_to_time("20260101T020000Z")
+    return [] if time_year(packed) == 2025 else [f"year {time_year(packed)}"]
+
+
+def main():
+    feeds = {"new-year": generate(80, first_day=datetime.date(2025, 12, 29))}
+    failed = 0
+    with FeedServer(feeds) as server:
+        for function in CHECKS:
+            failures = function(server) if function.__code__.co_argcount else function()
+            print(f"{'FAIL' if failures else 'ok  '} {function.__name__}")
+            for failure in failures:
+                print(f"     {failure}")
+            failed += bool(failures)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+"""
+Host-side stand-in for the Altboard hardware.
+
+install() registers CPython versions of the MicroPython modules the firmware
+imports (machine, esp32, network, deflate, ntptime) and adds the
+MicroPython-only helpers to time (ticks_us, ticks_diff, sleep_ms, ...).
+Every Pin write lands on a shared Bus which watches CS, D/CX, WR and the
+data lines exactly like the panel would: on each WR rising edge with CS low
+it latches DB0-DB7 and hands the byte to an ILI9341 model that decodes
+CASET, PASET, RAMWR, MADCTL and COLMOD into an RGB565 frame buffer, and
+VSCRDEF/VSCRSADD into the scrolled view of it that ends up in screenshots.
+machine.deepsleep raises DeepSleep, and RTC memory, the reset cause and
+the wake reason (set BUS.wake_reason) carry over to the next main.main().
+
+    import tools.emulator as emulator
+    bus = emulator.install()
+    from lib.display_driver import DisplayDriver
+    display = DisplayDriver()
+    display.init_display()
+    ...
+    bus.panel.save_png("screen.png")
+    print(bus.counters())
+"""
+import struct
+import sys
+import time
+import types
+import zlib
+from array import array
+
+# machine.reset_cause() and machine.wake_reason() values
+PWRON_RESET = 1
+DEEPSLEEP_RESET = 4
+EXT0_WAKE = 2
+TIMER_WAKE = 4
+# Pin.irq(wake=...) values
+SLEEP = 2
+DEEPSLEEP = 4
+
+# Pin numbers, as wired in README.md
+DATA_PINS = [35, 36, 37, 38, 39, 40, 41, 42, 2]
+PIN_DC = 13
+PIN_WR = 12
+PIN_CS = 11
+PIN_RESET = 14
+PIN_BACKLIGHT = 3
+
+# Panel geometry in its native (portrait) orientation
+PANEL_COLUMNS = 240
+PANEL_PAGES = 320
+
+# ILI9341 commands understood by the model
+SWRESET = 0x01
+SLPIN = 0x10
+SLPOUT = 0x11
+NORON = 0x13
+DISPOFF = 0x28
+DISPON = 0x29
+CASET = 0x2A
+PASET = 0x2B
+RAMWR = 0x2C
+VSCRDEF = 0x33
+MADCTL = 0x36
+VSCRSADD = 0x37
+COLMOD = 0x3A
+RAMWRC = 0x3C
+
+COMMAND_NAMES = {
+    SWRESET: "SWRESET", SLPIN: "SLPIN", SLPOUT: "SLPOUT", NORON: "NORON",
+    DISPOFF: "DISPOFF", DISPON: "DISPON", CASET: "CASET", PASET: "PASET",
+    RAMWR: "RAMWR", VSCRDEF: "VSCRDEF", MADCTL: "MADCTL", VSCRSADD: "VSCRSADD",
+    COLMOD: "COLMOD", RAMWRC: "RAMWRC",
+}
+
+
+class ILI9341:
+    """Decodes the 8-bit 8080 byte stream into a frame buffer."""
+
+    def __init__(self):
+        self.gram = array("H", bytes(2 * PANEL_COLUMNS * PANEL_PAGES))
+        self.commands = {}  # command -> number of times it was sent
+        self.reset()
+
+    def reset(self):
+        self.command = None
+        self.params = []
+        self.madctl = 0
+        self.colmod = 0x66
+        self.sleeping = True
+        self.display_on = False
+        self.columns = (0, PANEL_COLUMNS - 1)
+        self.pages = (0, PANEL_PAGES - 1)
+        self.column = 0
+        self.page = 0
+        self.pending = None  # High byte of a half-written RGB565 pixel
+        self.pixels_written = 0
+        # Vertical scrolling: fixed lines on top, scrolling lines, fixed lines at the bottom
+        self.scroll_area = (0, PANEL_PAGES, 0)
+        self.scroll_start = 0
+        self.scrolling = False
+
+    def write(self, is_data, byte):
+        if not is_data:
+            self.command = byte
+            self.params = []
+            self.pending = None
+            self.commands[byte] = self.commands.get(byte, 0) + 1
+            if byte == SWRESET:
+                self.reset()
+                self.command = byte
+            elif byte == SLPIN:
+                self.sleeping = True
+            elif byte == SLPOUT:
+                self.sleeping = False
+            elif byte == NORON:
+                self.scrolling = False
+            elif byte == DISPOFF:
+                self.display_on = False
+            elif byte == DISPON:
+                self.display_on = True
+            elif byte == RAMWR:
+                self.column, self.page = self.columns[0], self.pages[0]
+            return
+
+        if self.command in (RAMWR, RAMWRC):
+            self._pixel_byte(byte)
+            return
+
+        self.params.append(byte)
+        if self.command == CASET and len(self.params) == 4:
+            self.columns = self._range(self.params)
+        elif self.command == PASET and len(self.params) == 4:
+            self.pages = self._range(self.params)
+        elif self.command == MADCTL and len(self.params) == 1:
+            self.madctl = byte
+        elif self.command == COLMOD and len(self.params) == 1:
+            self.colmod = byte
+        elif self.command == VSCRDEF and len(self.params) == 6:
+            self.scroll_area = self._range(self.params) + (self.params[4] << 8 | self.params[5],)
+        elif self.command == VSCRSADD and len(self.params) == 2:
+            self.scroll_start = self.params[0] << 8 | self.params[1]
+            self.scrolling = True
+
+    @staticmethod
+    def _range(params):
+        return (params[0] << 8 | params[1], params[2] << 8 | params[3])
+
+    def _pixel_byte(self, byte):
+        if self.pending is None:
+            self.pending = byte
+            return
+        color = self.pending << 8 | byte
+        self.pending = None
+        self._store(self.column, self.page, color)
+        self.pixels_written += 1
+
+        # Column address runs fastest, then the page address, wrapping to the window start
+        if self.column < self.columns[1]:
+            self.column += 1
+        else:
+            self.column = self.columns[0]
+            self.page = self.page + 1 if self.page < self.pages[1] else self.pages[0]
+
+    def _store(self, column, page, color):
+        # MADCTL: MY (0x80) mirrors pages, MX (0x40) mirrors columns, MV (0x20) exchanges them
+        if self.madctl & 0x20:
+            column, page = page, column
+        if self.madctl & 0x40:
+            column = PANEL_COLUMNS - 1 - column
+        if self.madctl & 0x80:
+            page = PANEL_PAGES - 1 - page
+        if 0 <= column < PANEL_COLUMNS and 0 <= page < PANEL_PAGES:
+            self.gram[page * PANEL_COLUMNS + column] = color
+
+    def shown_page(self, line):
+        """The frame buffer page shown on panel line, after vertical scrolling."""
+        top, height, _ = self.scroll_area
+        if not self.scrolling or not top <= line < top + height:
+            return line
+        return top + (self.scroll_start - top + line - top) % height
+
+    def pixel(self, x, y):
+        """
+        Color shown at logical (x, y) as the board is mounted, i.e. the inverse of
+        DisplayDriver.transform_coordinates.
+        """
+        return self.gram[self.shown_page(PANEL_PAGES - 1 - x) * PANEL_COLUMNS + (PANEL_COLUMNS - 1 - y)]
+
+    def rgb_rows(self):
+        """Yield the logical 320x240 image as rows of 8-bit RGB bytes."""
+        for y in range(PANEL_COLUMNS):
+            row = bytearray(3 * PANEL_PAGES)
+            for x in range(PANEL_PAGES):
+                color = self.pixel(x, y)
+                row[3 * x] = ((color >> 11) & 0x1F) * 255 // 31
+                row[3 * x + 1] = ((color >> 5) & 0x3F) * 255 // 63
+                row[3 * x + 2] = (color & 0x1F) * 255 // 31
+            yield bytes(row)
+
+    def save_ppm(self, path):
+        with open(path, "wb") as file:
+            file.write(b"P6\n%d %d\n255\n" % (PANEL_PAGES, PANEL_COLUMNS))
+            for row in self.rgb_rows():
+                file.write(row)
+
+    def png_bytes(self):
+        def chunk(kind, data):
+            body = kind + data
+            return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+        raw = b"".join(b"\x00" + row for row in self.rgb_rows())
+        header = struct.pack(">IIBBBBB", PANEL_PAGES, PANEL_COLUMNS, 8, 2, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+                + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b""))
+
+    def save_png(self, path):
+        with open(path, "wb") as file:
+            file.write(self.png_bytes())
+
+
+class Bus:
+    """Shared state of every emulated GPIO, with the panel listening on the display pins."""
+
+    def __init__(self):
+        self.panel = ILI9341()
+        self.levels = {}
+        self.irqs = {}
+        self.duties = {}        # PWM duty (0-65535) of each pin driven by machine.PWM
+        self.wake_pins = {}     # Pin number -> SLEEP and/or DEEPSLEEP, from Pin.irq(wake=...)
+        self.slept_ms = 0       # Time asked for in machine.lightsleep
+        self.held = {}          # Pin number -> hold flag, from Pin.init(hold=...)
+        self.rtc_memory = b""   # machine.RTC().memory(), kept through DeepSleep
+        self.reset_cause = PWRON_RESET
+        self.wake_reason = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.pin_writes = 0    # Calls that drive an output pin
+        self.pin_toggles = 0   # Writes that actually changed the level
+        self.wr_cycles = 0     # WR rising edges while CS is low, i.e. bytes on the bus
+        self.cs_transactions = 0
+        self.command_bytes = 0
+        self.data_bytes = 0
+        self.panel.pixels_written = 0
+
+    def counters(self):
+        return {
+            "pin_writes": self.pin_writes,
+            "pin_toggles": self.pin_toggles,
+            "wr_cycles": self.wr_cycles,
+            "cs_transactions": self.cs_transactions,
+            "command_bytes": self.command_bytes,
+            "data_bytes": self.data_bytes,
+            "pixels": self.panel.pixels_written,
+        }
+
+    def read(self, number):
+        return self.levels.get(number, 1)
+
+    def write(self, number, level):
+        level = 1 if level else 0
+        previous = self.levels.get(number, 0)
+        self.levels[number] = level
+        self.pin_writes += 1
+        if level == previous:
+            return
+        self.pin_toggles += 1
+
+        if number == PIN_CS and level == 0:
+            self.cs_transactions += 1
+        elif number == PIN_WR and level == 1 and self.levels.get(PIN_CS, 1) == 0:
+            byte = 0
+            for bit, pin in enumerate(DATA_PINS[:8]):
+                byte |= self.levels.get(pin, 0) << bit
+            is_data = self.levels.get(PIN_DC, 0) == 1
+            self.wr_cycles += 1
+            if is_data:
+                self.data_bytes += 1
+            else:
+                self.command_bytes += 1
+            self.panel.write(is_data, byte)
+        elif number == PIN_RESET and level == 0:
+            self.panel.reset()
+
+    def press(self, number):
+        """Drive an input pin low then high, firing its IRQ handler on both edges."""
+        for level in (0, 1):
+            self.levels[number] = level
+            handler = self.irqs.get(number)
+            if handler is not None:
+                handler(Pin(number))
+
+
+BUS = Bus()
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    def __init__(self, number, mode=-1, pull=-1, value=None):
+        self.number = number
+        if mode == self.IN and number not in BUS.levels:
+            BUS.levels[number] = 1 if pull == self.PULL_UP else 0
+        if value is not None:
+            BUS.write(number, value)
+
+    def value(self, *args):
+        if args:
+            BUS.write(self.number, args[0])
+            return None
+        return BUS.read(self.number)
+
+    def on(self):
+        BUS.write(self.number, 1)
+
+    def off(self):
+        BUS.write(self.number, 0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, wake=None):
+        # As on the ESP32 port: a wake IRQ is EXT0 and leaves the edge handler alone, one pin at most
+        if wake is not None:
+            if trigger != self.WAKE_LOW:
+                raise ValueError("bad wake trigger")
+            if any(number != self.number for number in BUS.wake_pins):
+                raise ValueError("no resources")
+            BUS.wake_pins[self.number] = wake
+            return
+        BUS.wake_pins.pop(self.number, None)
+        BUS.irqs[self.number] = handler
+
+    def init(self, mode=-1, pull=-1, value=None, hold=None):
+        if value is not None:
+            BUS.write(self.number, value)
+        if hold is not None:
+            BUS.held[self.number] = hold
+
+
+class PWM:
+    """machine.PWM, the duty of each pin is kept in Bus.duties."""
+
+    def __init__(self, pin, freq=0, duty_u16=0, **kwargs):
+        self.number = pin.number
+        self.frequency = freq
+        BUS.duties[self.number] = duty_u16
+
+    def freq(self, *args):
+        if args:
+            self.frequency = args[0]
+            return None
+        return self.frequency
+
+    def duty_u16(self, *args):
+        if args:
+            BUS.duties[self.number] = args[0]
+            return None
+        return BUS.duties[self.number]
+
+    def deinit(self):
+        BUS.duties[self.number] = 0
+
+
+class RTC:
+    def memory(self, *args):
+        if args:
+            BUS.rtc_memory = bytes(args[0])
+            return None
+        return BUS.rtc_memory
+
+
+class DeepSleep(Exception):
+    """Raised by machine.deepsleep, the firmware would start again from main.py."""
+
+    def __init__(self, time_ms):
+        super().__init__(time_ms)
+        self.time_ms = time_ms
+
+
+def _deepsleep(time_ms=None):
+    BUS.reset_cause = DEEPSLEEP_RESET
+    raise DeepSleep(time_ms)
+
+
+class SPI:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class NVS:
+    """In-memory esp32.NVS, shared between namespaces of the same name."""
+    stores = {}
+
+    def __init__(self, namespace):
+        self.data = NVS.stores.setdefault(namespace, {})
+
+    def set_blob(self, key, value):
+        self.data[key] = bytes(value)
+
+    def get_blob(self, key, buffer):
+        if key not in self.data:
+            raise OSError(-0x1102, "ESP_ERR_NVS_NOT_FOUND")
+        value = self.data[key]
+        buffer[:len(value)] = value
+        return len(value)
+
+    def set_i32(self, key, value):
+        self.data[key] = int(value)
+
+    def get_i32(self, key):
+        if key not in self.data:
+            raise OSError(-0x1102, "ESP_ERR_NVS_NOT_FOUND")
+        return self.data[key]
+
+    def erase_key(self, key):
+        if key not in self.data:
+            raise OSError(-0x1102, "ESP_ERR_NVS_NOT_FOUND")
+        del self.data[key]
+
+    def commit(self):
+        pass
+
+
+class WLAN:
+    """A radio that is never connected."""
+
+    def __init__(self, interface=0):
+        self.interface = interface
+        self._active = False
+
+    def active(self, *args):
+        if args:
+            self._active = bool(args[0])
+        return self._active
+
+    def isconnected(self):
+        return False
+
+    def connect(self, ssid, password):
+        pass
+
+    def config(self, **kwargs):
+        pass
+
+    def scan(self):
+        return []
+
+    def ifconfig(self):
+        return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "192.168.4.1")
+
+
+class DeflateIO:
+    """
+    The decompressing half of MicroPython's deflate.DeflateIO, over zlib.
+    Input is read from stream with readinto(), as the firmware's stream does.
+    """
+    AUTO, RAW, ZLIB, GZIP = 0, 1, 2, 3
+
+    def __init__(self, stream, format=AUTO, wbits=0, close=False):
+        wbits = wbits or 15
+        self.stream = stream
+        self.inflater = zlib.decompressobj({self.AUTO: 32 + wbits, self.RAW: -wbits,
+                                            self.ZLIB: wbits, self.GZIP: 16 + wbits}[format])
+        self.input = bytearray(256)
+        self.pending = b""
+        self.close_stream = close
+
+    def readinto(self, buf):
+        while not self.pending and not self.inflater.eof:
+            data = self.inflater.unconsumed_tail
+            if not data:
+                count = self.stream.readinto(self.input)
+                if not count:
+                    raise OSError("deflate stream ended early")
+                data = bytes(self.input[:count])
+            # Never inflate more than the caller asked for, like the firmware's fixed window
+            self.pending = self.inflater.decompress(data, len(buf))
+        count = min(len(buf), len(self.pending))
+        buf[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+    def read(self, size):
+        buf = bytearray(size)
+        return bytes(buf[:self.readinto(buf)])
+
+    def close(self):
+        if self.close_stream:
+            self.stream.close()
+
+
+def _ticks_us():
+    return time.perf_counter_ns() // 1000
+
+
+def _ticks_ms():
+    return time.perf_counter_ns() // 1000000
+
+
+def _lightsleep(time_ms=None):
+    """
+    machine.lightsleep: the board is idle, so nothing happens but the clock
+    going on. Without a timeout it returns after 10 ms, as if a button woke it.
+    """
+    if any(wake & SLEEP and BUS.read(number) == 0 for number, wake in BUS.wake_pins.items()):
+        return
+    time_ms = 10 if time_ms is None else time_ms
+    BUS.slept_ms += time_ms
+    time.sleep(time_ms / 1000)
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    """Register the stand-in modules and return the shared Bus."""
+    _module("machine", Pin=Pin, PWM=PWM, SPI=SPI, RTC=RTC, lightsleep=_lightsleep, deepsleep=_deepsleep,
+            reset_cause=lambda: BUS.reset_cause, wake_reason=lambda: BUS.wake_reason,
+            PWRON_RESET=PWRON_RESET, DEEPSLEEP_RESET=DEEPSLEEP_RESET, EXT0_WAKE=EXT0_WAKE, TIMER_WAKE=TIMER_WAKE,
+            SLEEP=SLEEP, DEEPSLEEP=DEEPSLEEP)
+    _module("esp32", NVS=NVS, gpio_deep_sleep_hold=lambda enable: None)
+    _module("network", WLAN=WLAN, STA_IF=0, AP_IF=1)
+    _module("deflate", DeflateIO=DeflateIO, AUTO=DeflateIO.AUTO, RAW=DeflateIO.RAW,
+            ZLIB=DeflateIO.ZLIB, GZIP=DeflateIO.GZIP)
+    _module("ntptime", settime=lambda: None)
+    time.ticks_us = _ticks_us
+    time.ticks_ms = _ticks_ms
+    time.ticks_diff = lambda end, start: end - start
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+    return BUS
+
+
+def reset():
+    """Blank the panel and zero the counters, keeping the registered modules."""
+    BUS.panel = ILI9341()
+    BUS.reset_counters()
+    return BUS
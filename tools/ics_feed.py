@@ -0,0 +1,233 @@
+"""
+Synthetic Pronote-style iCal feeds and a local HTTP server for them.
+
+    python tools/ics_feed.py 10000 > feed.ics
+    python tools/ics_feed.py 10000 --serve 8080
+    python tools/ics_feed.py 10000 --serve 8080 --chunked
+    python tools/ics_feed.py 10000 --serve 8080 --gzip
+
+The generator follows what Pronote exports: one VEVENT per lesson over the
+school days of a year, SUMMARY lines with French prefixes such as
+"Cours annulé : ", CATEGORIES with an exceptional status, long DESCRIPTION
+lines folded at 75 octets and a multi-day holiday event every few weeks.
+"""
+import argparse
+import datetime
+import gzip as _gzip
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools import emulator
+
+emulator.install()
+
+from lib.pronote import NAME_TO_ID
+
+SUBJECTS = [name for name in NAME_TO_ID if name not in ("Vacances", "Férié")]
+TEACHERS = ["MARTIN J.", "BERNARD C.", "DUBOIS A.", "THOMAS L.", "ROBERT M.", "PETIT S.", "DURAND E.", "LEROY P."]
+ROOMS = ["B12", "A03", "A10", "LAB", "GYM", "C01", "CDI", "AUD"]
+STATUSES = [
+    ("", ""), ("", ""), ("", ""), ("", ""), ("", ""), ("", ""),
+    ("Exceptionnel", ""), ("Prof. absent", "Prof. absent : "), ("Cours annulé", "Cours annulé : "),
+    ("Changement de salle", ""), ("Remplacement", ""),
+]
+LESSON_HOURS = [8, 9, 10, 11, 13, 14, 15, 16]
+HOLIDAY_EVERY = 150  # Lessons between two multi-day holiday events
+
+
+def fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return data + b"\r\n"
+    parts = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1  # Never split a UTF-8 sequence
+        parts.append(data[:cut])
+        data = data[cut:]
+        limit = 74  # Continuation lines start with a space
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def stamp(moment):
+    return moment.strftime("%Y%m%dT%H%M%SZ")
+
+
+def lesson(uid, start, rng):
+    subject = rng.choice(SUBJECTS)
+    teacher = rng.choice(TEACHERS)
+    room = rng.choice(ROOMS)
+    status, prefix = rng.choice(STATUSES)
+    end = start + datetime.timedelta(minutes=rng.choice((55, 55, 55, 115)))
+    category = "Cours" + (f" - {status}" if status else "")
+    lines = [
+        "BEGIN:VEVENT",
+        f"CATEGORIES;LANGUAGE=fr:{category}",
+        "DTSTAMP:20240901T060000Z",
+        "LAST-MODIFIED:20240901T060000Z",
+        f"UID:Cours-{uid}-{start:%Y%m%d}-Index-Education.net",
+        f"DTSTART:{stamp(start)}",
+        f"DTEND:{stamp(end)}",
+        f"SUMMARY;LANGUAGE=fr:{prefix}{subject.upper()[:12]} / {subject} - {teacher}",
+        f"LOCATION;LANGUAGE=fr:{room}",
+        f"DESCRIPTION;LANGUAGE=fr:Matière : {subject}\\nProfesseur : {teacher}\\nSalle : {room}"
+        f"\\nClasse : 1ERE B\\nGroupe : [1ERE B] Spécialité\\nMémo : Penser à apporter le manuel et la calculatrice",
+        "END:VEVENT",
+    ]
+    return b"".join(fold(line) for line in lines)
+
+
+def holiday(uid, start):
+    end = start + datetime.timedelta(days=9)
+    lines = [
+        "BEGIN:VEVENT",
+        "CATEGORIES;LANGUAGE=fr:Vacances",
+        "DTSTAMP:20240901T060000Z",
+        f"UID:Vacances-{uid}-Index-Education.net",
+        f"DTSTART:{stamp(start)}",
+        f"DTEND:{stamp(end)}",
+        "SUMMARY;LANGUAGE=fr:Vacances",
+        "END:VEVENT",
+    ]
+    return b"".join(fold(line) for line in lines)
+
+
+def generate(count, seed=2024, first_day=datetime.date(2024, 9, 2)):
+    """Return a feed of count events as bytes, deterministic for a given seed."""
+    rng = random.Random(seed)
+    chunks = [fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "METHOD:PUBLISH",
+        "VERSION:2.0",
+        "PRODID:-//Index Education//PRONOTE 2024.3.8//FR",
+        "X-WR-CALNAME;LANGUAGE=fr:Emploi du temps",
+        "CALSCALE:GREGORIAN",
+    )]
+    day = first_day
+    produced = 0
+    while produced < count:
+        if day.weekday() < 5:
+            for hour in LESSON_HOURS:
+                if produced >= count:
+                    break
+                if produced and produced % HOLIDAY_EVERY == 0:
+                    chunks.append(holiday(produced, datetime.datetime.combine(day, datetime.time(0, 0))))
+                else:
+                    start = datetime.datetime.combine(day, datetime.time(hour, rng.choice((0, 0, 0, 30))))
+                    chunks.append(lesson(produced, start, rng))
+                produced += 1
+        day += datetime.timedelta(days=1)
+    chunks.append(fold("END:VCALENDAR"))
+    return b"".join(chunks)
+
+
+class FeedServer:
+    """
+    Serves in-memory feeds on 127.0.0.1, as /<name>.ics with a Content-Length
+    or, with chunked=True, with Transfer-Encoding: chunked, from a background
+    thread. With gzip=True, clients that send Accept-Encoding: gzip get the
+    feed compressed. sent[name] is the body size of the last response for
+    name, as it went over the wire. Every feed has an ETag, and a matching
+    If-None-Match gets 304 Not Modified. delay holds each response back by
+    that many seconds, like a slow link would.
+    """
+    CHUNK_SIZE = 8000
+
+    def __init__(self, feeds, port=0, chunked=False, gzip=False, delay=0):
+        self.feeds = feeds
+        self.sent = {}
+        compressed = {}
+        sent = self.sent
+        chunk_size = self.CHUNK_SIZE
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                name = self.path.split("?")[0].lstrip("/").rsplit(".ics", 1)[0]
+                body = feeds.get(name)
+                if body is None:
+                    self.send_error(404)
+                    return
+                time.sleep(delay)
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    sent[name] = 0
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/calendar; charset=utf-8")
+                self.send_header("ETag", etag)
+                if gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    if name not in compressed:
+                        compressed[name] = _gzip.compress(body, 6)  # What web servers use by default
+                    body = compressed[name]
+                    self.send_header("Content-Encoding", "gzip")
+                sent[name] = len(body)
+                if not chunked:
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for start in range(0, len(body), chunk_size):
+                    chunk = body[start:start + chunk_size]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{name}.ics"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("events", type=int, help="number of events in the feed")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="serve the feed as /feed.ics instead of printing it")
+    parser.add_argument("--chunked", action="store_true", help="serve with Transfer-Encoding: chunked")
+    parser.add_argument("--gzip", action="store_true", help="compress the feed for clients that accept gzip")
+    args = parser.parse_args()
+
+    feed = generate(args.events, args.seed)
+    if args.serve is None:
+        sys.stdout.buffer.write(feed)
+        return
+    with FeedServer({"feed": feed}, args.serve, args.chunked, args.gzip) as server:
+        print("Serving", server.url("feed"), f"({len(feed)} bytes)")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Render the firmware's screens on the emulated panel.
+
+    python tools/render_screens.py --out screens/
+    python tools/render_screens.py --update tools/golden/   # record golden images
+    python tools/render_screens.py --check tools/golden/    # compare against them
+
+Each screen is drawn on a blank panel and saved as PNG (or PPM with --ppm),
+together with the bus counters it took to draw it. pronote_wifi also checks
+that toggling the Wi-Fi icon leaves the day headers as they were.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # Fonts are opened relative to the firmware root
+
+from tools import emulator
+
+BUS = emulator.install()
+
+from lib.display_driver import DisplayDriver
+from lib.nvs import NVSManager
+from lib.pronote import Pronote, SUBJECT_MAPPINGS, pack_time
+
+# A busy week: (day, first slot, number of slots, subject id, room)
+DENSE_WEEK = [
+    (0, 0, 2, 1, "B12"), (0, 2, 1, 5, "A03"), (0, 3, 1, 4, "A03"), (0, 5, 2, 2, "LAB"), (0, 7, 1, 12, "C01"), (0, 8, 2, 8, "GYM"),
+    (1, 0, 1, 14, "A10"), (1, 1, 2, 6, "B12"), (1, 3, 1, 11, "A03"), (1, 5, 1, 13, "LAB"), (1, 6, 2, 5, "A03"), (1, 8, 1, 3, "CDI"),
+    (2, 0, 2, 2, "LAB"), (2, 2, 2, 1, "B12"), (2, 4, 1, 15, "AUD"),
+    (3, 0, 1, 4, "A03"), (3, 1, 1, 12, "C01"), (3, 2, 2, 7, "AUD"), (3, 5, 2, 8, "GYM"), (3, 7, 1, 20, "A10"), (3, 8, 2, 17, "B12"),
+    (4, 0, 2, 1, "B12"), (4, 2, 1, 14, "A10"), (4, 3, 1, 5, "A03"), (4, 5, 1, 16, "AUD"), (4, 6, 2, 13, "LAB"), (4, 8, 1, 18, "AUD"),
+]
+
+
+# Half-hour lessons, overlapping groups, a clash and a bank holiday: (day, start, end as (hour, minute), subject id, room)
+OVERLAP_WEEK = [
+    (0, (8, 0), (9, 30), 1, "B12"), (0, (8, 30), (10, 0), 2, "LAB"), (0, (9, 0), (9, 30), 3, "CDI"),
+    (0, (10, 0), (10, 30), 5, "A03"), (0, (10, 30), (12, 0), 4, "A03"), (0, (13, 15), (14, 45), 8, "GYM"),
+    (1, (8, 0), (10, 0), 6, "B12"), (1, (8, 0), (10, 0), 12, "C01"), (1, (10, 15), (11, 45), 14, "A10"),
+    (1, (14, 0), (14, 30), 11, "A03"), (1, (14, 30), (15, 0), 13, "LAB"),
+    (2, (9, 0), (12, 0), 16, "AUD"), (2, (9, 0), (10, 0), 17, "B12"), (2, (10, 0), (11, 0), 18, "AUD"),
+    (2, (11, 0), (12, 0), 5, "A03"), (3, (8, 0), (18, 0), 10, ""),
+]
+
+
+def event_dict(day, start, end, subject_id, room):
+    """One event in the format Pronote.update_calendar stores, start and end as (hour, minute)."""
+    name, color = SUBJECT_MAPPINGS[subject_id]
+    return {
+        "subject": name,
+        "teacher": "M. Martin",
+        "location": room,
+        "exceptional": "",
+        "start": pack_time(2024, 246 + day, day, *start),
+        "end": pack_time(2024, 246 + day, day, *end),
+        "color": color,
+    }
+
+
+def dense_week():
+    """The DENSE_WEEK fixture in the format Pronote.update_calendar stores."""
+    week = [[] for _ in range(7)]
+    for day, first, count, subject_id, room in DENSE_WEEK:
+        hour = Pronote.FIRST_HOUR + first
+        week[day].append(event_dict(day, (hour, 0), (hour + count, 0), subject_id, room))
+    return week
+
+
+def overlap_week():
+    """The OVERLAP_WEEK fixture in the format Pronote.update_calendar stores."""
+    week = [[] for _ in range(7)]
+    for day, start, end, subject_id, room in OVERLAP_WEEK:
+        week[day].append(event_dict(day, start, end, subject_id, room))
+    return week
+
+
+def use_week(week):
+    """Point Pronote at a temporary calendar file holding week, and an empty event store next to it."""
+    folder = tempfile.mkdtemp(prefix="altboard-")
+    path = os.path.join(folder, "calendar_data.json")
+    with open(path, "w") as file:
+        json.dump(week, file)
+    Pronote.CALENDAR_FILE = path
+    Pronote.STORE_FILE = os.path.join(folder, "events.bin")
+
+
+def new_display():
+    """A freshly initialised driver on a blank panel with zeroed counters."""
+    emulator.reset()
+    display = DisplayDriver()
+    display.init_display()
+    BUS.reset_counters()
+    return display
+
+
+def new_nvs():
+    emulator.NVS.stores.clear()
+    nvs = NVSManager()
+    nvs.set_string("ssid", "Altboard-Home")
+    nvs.set_string("pass", "hunter22")
+    return nvs
+
+
+def render_main_menu():
+    from states import MainMenuState
+    return MainMenuState(new_display(), new_nvs())
+
+
+def render_settings():
+    from states import SettingsState
+    return SettingsState(new_display(), new_nvs())
+
+
+def render_pronote():
+    from states import PronoteState
+    use_week(dense_week())
+    return PronoteState(new_display(), new_nvs())
+
+
+def render_pronote_overlaps():
+    from states import PronoteState
+    use_week(overlap_week())
+    return PronoteState(new_display(), new_nvs())
+
+
+def header_pixels(under_icon, height=20):
+    """The pixels of the top height rows, those under the Wi-Fi icon or all the others."""
+    from lib.wifi_icons import WiFiIcons
+    return [BUS.panel.pixel(x, y) for y in range(height) for x in range(320)
+            if (WiFiIcons.X <= x < WiFiIcons.X + 14 and WiFiIcons.Y <= y < WiFiIcons.Y + 14) == under_icon]
+
+
+def render_pronote_wifi():
+    """
+    The Pronote screen after the Wi-Fi icon went on and off again. The icon
+    is drawn outside the scene, so the screen must leave its corner blank
+    and the toggles must leave the rest of the day headers alone.
+    """
+    from lib.render_queue import RenderQueue
+    from lib.wifi_icons import WiFiIcons
+    from lib.wifi_manager import WiFiManager
+    state = render_pronote()
+    covered = sum(1 for color in header_pixels(True) if color)
+    before = header_pixels(False)
+    queue = RenderQueue()
+    manager = WiFiManager(state.display_driver, WiFiIcons(), queue)
+    for connected in (True, False):
+        manager.show_status(connected)
+        queue.run_pending()
+    changed = sum(old != new for old, new in zip(before, header_pixels(False)))
+    if covered or changed:
+        PROBLEMS.append(f"pronote_wifi: {covered} header pixels under the Wi-Fi icon, {changed} changed by it")
+    return state
+
+
+def render_agenda():
+    from states import AgendaState
+    use_week(dense_week())
+    return AgendaState(new_display(), new_nvs())
+
+
+PROBLEMS = []  # Found by the screens that check what they drew
+
+SCREENS = {
+    "main_menu": render_main_menu,
+    "settings": render_settings,
+    "pronote": render_pronote,
+    "pronote_overlaps": render_pronote_overlaps,
+    "pronote_wifi": render_pronote_wifi,
+    "agenda": render_agenda,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("screens", nargs="*", default=list(SCREENS), help="screens to render (default: all)")
+    parser.add_argument("--out", help="directory to write images and counters to")
+    parser.add_argument("--ppm", action="store_true", help="write PPM instead of PNG")
+    parser.add_argument("--update", metavar="DIR", help="record golden PNGs into DIR")
+    parser.add_argument("--check", metavar="DIR", help="compare against golden PNGs in DIR")
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.screens:
+        SCREENS[name]()
+        counters = BUS.counters()
+        print(f"{name:<12} " + " ".join(f"{key}={value}" for key, value in counters.items()))
+
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            if args.ppm:
+                BUS.panel.save_ppm(os.path.join(args.out, name + ".ppm"))
+            else:
+                BUS.panel.save_png(os.path.join(args.out, name + ".png"))
+            with open(os.path.join(args.out, name + ".json"), "w") as file:
+                json.dump(counters, file, indent=2)
+        if args.update:
+            os.makedirs(args.update, exist_ok=True)
+            BUS.panel.save_png(os.path.join(args.update, name + ".png"))
+        if args.check:
+            with open(os.path.join(args.check, name + ".png"), "rb") as file:
+                if file.read() != BUS.panel.png_bytes():
+                    failures.append(name)
+
+    for problem in PROBLEMS:
+        print(problem)
+    if failures:
+        print("Differs from golden image:", ", ".join(failures))
+    if failures or PROBLEMS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
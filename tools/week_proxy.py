@@ -0,0 +1,162 @@
+"""
+A companion service that digests the Pronote feed for the board.
+
+    python tools/week_proxy.py --port 8089
+    python tools/week_proxy.py --feed http://127.0.0.1:8080/feed.ics --refresh 300
+
+It downloads the whole iCal feed, parses it with the firmware's own parser
+(lib/pronote.py, so subjects map exactly as on the board) and answers
+
+    GET /weeks/YYYYMMDD?count=N
+
+with the events of the N weeks from the one holding that date, as an event
+store file (lib/event_store.py): a few hundred bytes per week that the board
+merges into its store without any parsing. Responses carry an ETag and a
+matching If-None-Match gets 304 Not Modified. The feed is downloaded again
+once it is older than --refresh seconds.
+
+Point the board at it with Pronote.PROXY_URL = "http://<host>:8089".
+"""
+import argparse
+import datetime
+import io
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools import emulator
+
+emulator.install()
+# The board's clock runs on UTC, and the parser's time zone shift assumes it
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+from lib.event_store import StoreWriter
+from lib.pronote import Pronote, pack_time
+
+
+def day_start(date):
+    return pack_time(date.year, date.timetuple().tm_yday, date.weekday(), 0, 0)
+
+
+def day_end(date):
+    return pack_time(date.year, date.timetuple().tm_yday, date.weekday(), 23, 59)
+
+
+class WeekProxy:
+    """
+    Serves week blobs of the feed at feed_url on 127.0.0.1 (or host) from a
+    background thread. fetches counts the feed downloads.
+    """
+    def __init__(self, feed_url, port=0, refresh=900, host="127.0.0.1"):
+        self.feed_url = feed_url
+        self.refresh = refresh
+        self.events = []
+        self.fetched = None
+        self.fetches = 0
+        self.lock = threading.Lock()
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                parts = path.strip("/").split("/")
+                try:
+                    if len(parts) != 2 or parts[0] != "weeks":
+                        raise ValueError(path)
+                    date = datetime.datetime.strptime(parts[1], "%Y%m%d").date()
+                    count = int(dict(item.split("=", 1) for item in query.split("&") if "=" in item).get("count", 1))
+                except ValueError:
+                    self.send_error(404)
+                    return
+                try:
+                    blob = proxy.week_blob(date, count)
+                except Exception as e:
+                    self.send_error(502, f"Feed download failed: {e}")
+                    return
+                etag = f'"{zlib.crc32(blob):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(blob)))
+                self.end_headers()
+                self.wfile.write(blob)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def feed_events(self):
+        """Every event of the feed sorted by start, downloaded again once older than refresh seconds."""
+        with self.lock:
+            if self.fetched is None or time.monotonic() - self.fetched >= self.refresh:
+                pronote = Pronote()
+                pronote.FEED_START = 0
+                pronote.FEED_END = 1 << 30  # The whole feed, not just the board's window
+                events = []
+                pronote.get_week_schedule(self.feed_url, time.localtime(), on_parsed=events.append)
+                events.sort(key=lambda event: (event.start, event.end))
+                self.events = events
+                self.fetched = time.monotonic()
+                self.fetches += 1
+            return self.events
+
+    def week_blob(self, date, count):
+        """The events overlapping count weeks from the week of date, as an event store file."""
+        monday = date - datetime.timedelta(days=date.weekday())
+        start = day_start(monday)
+        end = day_end(monday + datetime.timedelta(days=7 * count - 1))
+        blob = io.BytesIO()
+        writer = StoreWriter(blob)
+        for event in self.feed_events():
+            if event.start <= end and event.end >= start:
+                writer.add_event(event)
+        writer.finish()
+        return blob.getvalue()
+
+    def url(self):
+        return f"http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feed", default=Pronote.FEED_URL, help="iCal feed URL (default: the one in lib/pronote.py)")
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on (default: all)")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--refresh", type=int, default=900, help="seconds before the feed is downloaded again")
+    args = parser.parse_args()
+
+    with WeekProxy(args.feed, args.port, args.refresh, args.host) as proxy:
+        print("Serving week blobs on", proxy.url(), "for", args.feed)
+        try:
+            proxy.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()